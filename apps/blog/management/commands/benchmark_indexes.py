@@ -0,0 +1,94 @@
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from blog.models import Post, Comment
+from blog.seeding import seed_dataset
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway dataset and compare query plans and latency of the main "
+        "post/comment query patterns without and with the composite indexes. "
+        "Everything runs in one transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--plans', action='store_true', help="Print EXPLAIN ANALYZE output.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                sample = self.seed(options)
+                indexed = self.measure(sample, options)
+                with connection.schema_editor() as schema_editor:
+                    for model in (Post, Comment):
+                        for index in self.benchmarked_indexes(model):
+                            schema_editor.remove_index(model, index)
+                self.analyze()
+                plain = self.measure(sample, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'query':<20}{'without (ms)':>14}{'with (ms)':>12}{'speedup':>10}")
+        for name, after in indexed.items():
+            before = plain[name]
+            self.stdout.write(
+                f"{name:<20}{before['median_ms']:>14.3f}{after['median_ms']:>12.3f}"
+                f"{before['median_ms'] / after['median_ms']:>9.1f}x")
+            if options['plans']:
+                self.stdout.write(f"\n-- {name}, without indexes\n{before['plan']}")
+                self.stdout.write(f"\n-- {name}, with indexes\n{after['plan']}\n")
+
+    def benchmarked_indexes(self, model):
+        # the GIN search index is not part of these query patterns
+        return [index for index in model._meta.indexes if type(index).__name__ == 'Index']
+
+    def seed(self, options):
+        created = seed_dataset(
+            users=options['authors'], categories=1, posts=options['posts'],
+            comments=options['comments'], content_paragraphs=(1, 3), seed=8, batch_size=5000)
+        self.analyze()
+        return {
+            'author': created['users'][0],
+            'post': created['posts'][0],
+            'cursor': timezone.now() - timedelta(days=365),
+        }
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Post._meta.db_table}, {Comment._meta.db_table}')
+
+    def queries(self, sample):
+        return {
+            'author_posts': Post.objects.filter(author=sample['author']).order_by('-published')[:10],
+            'published_posts': Post.postobjects.order_by('-published')[:10],
+            'cursor_page': Post.objects.filter(
+                published__lt=sample['cursor']).order_by('-published', '-id')[:10],
+            'post_comments': Comment.objects.filter(post=sample['post']).order_by('created_at'),
+        }
+
+    def measure(self, sample, options):
+        results = {}
+        for name, queryset in self.queries(sample).items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {
+                'median_ms': statistics.median(timings),
+                'plan': queryset.explain(analyze=True),
+            }
+        return results
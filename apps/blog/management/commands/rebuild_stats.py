@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-category and per-author statistics (CategoryStats, AuthorStats) from Post."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        with transaction.atomic():
+            written = stats.rebuild(batch_size=batch_size)
+        summary = ', '.join(f'{count} {name}' for name, count in written.items())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {summary} row(s).'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from blog import stats
+from blog.models import Post, Comment
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.comment_count and Post.last_commented_at from the Comment table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it.")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+        posts = Post.objects.order_by().annotate(
+            actual_count=Coalesce(
+                Subquery(comments.values('post').annotate(n=Count('pk')).values('n')), 0),
+            actual_last=Subquery(comments.order_by('-created_at').values('created_at')[:1]),
+        ).only('id', 'comment_count', 'last_commented_at', 'category_id', 'author_id')
+
+        drifted = []
+        fixed = 0
+        for post in posts.iterator(chunk_size=batch_size):
+            if (post.comment_count, post.last_commented_at) == (post.actual_count, post.actual_last):
+                continue
+            post.comment_count = post.actual_count
+            post.last_commented_at = post.actual_last
+            post.updated_at = timezone.now()
+            drifted.append(post)
+            if len(drifted) >= batch_size:
+                fixed += self.save(drifted, dry_run)
+                drifted = []
+        fixed += self.save(drifted, dry_run)
+
+        verb = 'Found' if dry_run else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {fixed} post(s) with drifted comment counters.'))
+
+    def save(self, posts, dry_run):
+        if posts and not dry_run:
+            with transaction.atomic():
+                Post.objects.bulk_update(posts, ['comment_count', 'last_commented_at', 'updated_at'])
+                # the category and author comment totals are sums of these counters
+                stats.refresh_posts(posts)
+        return len(posts)
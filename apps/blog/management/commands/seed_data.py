@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.seeding import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate users, categories, posts with long content and comments "
+        "(skewed towards a few popular posts). --scale multiplies the base sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible content.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, scale, seed, batch_size, **options):
+        sizes = {name: max(1, int(options[name] * scale))
+                 for name in ('users', 'categories', 'posts', 'comments')}
+        with transaction.atomic():
+            created = seed_dataset(**sizes, seed=seed, batch_size=batch_size)
+        admin = created['users'][0]
+        self.stdout.write(self.style.SUCCESS(
+            'Created {users} users, {categories} categories, {posts} posts and '
+            '{comments} comments.'.format(**sizes)))
+        self.stdout.write(f'Staff user: {admin.username} / password')
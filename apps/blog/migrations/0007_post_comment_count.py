@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_counts(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    Comment = apps.get_model("blog", "Comment")
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by()
+    Post.objects.update(
+        comment_count=Coalesce(
+            Subquery(comments.values("post").annotate(n=Count("pk")).values("n")), 0
+        ),
+        last_commented_at=Subquery(
+            comments.order_by("-created_at").values("created_at")[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0006_post_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="last_commented_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_comment_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_stats(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Category = apps.get_model("blog", "Category")
+    for stats_model, owner, key, posts in (
+        (apps.get_model("blog", "CategoryStats"), Category, "category", "post"),
+        (apps.get_model("blog", "AuthorStats"), User, "author", "blog_posts"),
+    ):
+        published = Q(**{f"{posts}__status": "published"})
+        rows = owner.objects.order_by().annotate(
+            stat_post_count=Count(posts, filter=published),
+            stat_comment_count=Coalesce(
+                Sum(f"{posts}__comment_count", filter=published), 0
+            ),
+            stat_latest_post_at=Max(f"{posts}__published", filter=published),
+        ).values_list(
+            "pk", "stat_post_count", "stat_comment_count", "stat_latest_post_at"
+        )
+        stats_model.objects.bulk_create(
+            (
+                stats_model(
+                    **{f"{key}_id": pk},
+                    post_count=post_count,
+                    comment_count=comment_count,
+                    latest_post_at=latest_post_at,
+                )
+                for pk, post_count, comment_count, latest_post_at in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0009_post_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthorStats",
+            fields=[
+                ("post_count", models.PositiveIntegerField(default=0)),
+                ("comment_count", models.PositiveIntegerField(default=0)),
+                ("latest_post_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "author",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="CategoryStats",
+            fields=[
+                ("post_count", models.PositiveIntegerField(default=0)),
+                ("comment_count", models.PositiveIntegerField(default=0)),
+                ("latest_post_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="blog.category",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.utils import timezone
 # Create your models here.
 
@@ -13,7 +15,12 @@ class Category(models.Model):
 
 class Post(models.Model):
 
-    class PostObjects(models.Manager):
+    class PostManager(models.Manager):
+        def get_queryset(self):
+            # search_vector is as large as the text it indexes; search filters and ranks on it in SQL
+            return super().get_queryset().defer('search_vector')
+
+    class PostObjects(PostManager):
         def get_queryset(self):
             return super().get_queryset() .filter(status='published')
 
@@ -32,15 +39,47 @@ class Post(models.Model):
         on_delete=models.CASCADE,
         related_name='blog_posts')
     status = models.CharField(max_length=50, choices=options, default='published')
-    objects = models.Manager()
+    # maintained by blog.signals and the comment bulk endpoints, `manage.py reconcile_comment_counts` fixes drift
+    comment_count = models.PositiveIntegerField(default=0)
+    last_commented_at = models.DateTimeField(null=True, blank=True)
+    # any change to the post or to its comment counters, the conditional GET validator
+    updated_at = models.DateTimeField(auto_now=True)
+    # stored column, Postgres recomputes it whenever the row is written
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config='english')
+            + SearchVector('excerpt', weight='B', config='english')
+            + SearchVector('content', weight='C', config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    objects = PostManager()
     postobjects = PostObjects()
 
     class Meta():
         ordering = ['-published']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='blog_post_search_gin'),
+            # AuthorPostsView
+            models.Index(fields=['author', '-published'], name='blog_post_author_published'),
+            # default ordering and the (published, id) cursor
+            models.Index(fields=['-published', '-id'], name='blog_post_published_id'),
+            # Post.postobjects
+            models.Index(
+                fields=['-published'],
+                condition=models.Q(status='published'),
+                name='blog_post_live_published'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # the post_save handlers keeping blog.stats current write in the same transaction
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='posts')
@@ -51,3 +90,37 @@ class Comment(models.Model):
     comment = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # comments of a post, oldest first, and the latest one for last_commented_at
+            models.Index(fields=['post', 'created_at'], name='blog_comment_post_created'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # with the post counters and blog.stats, updated by post_save
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+
+
+class PostStats(models.Model):
+    """Aggregates over published posts, kept current by blog.stats."""
+    post_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    latest_post_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class CategoryStats(PostStats):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
+
+class AuthorStats(PostStats):
+    # comment_count counts the comments on the author's posts
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
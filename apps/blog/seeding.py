@@ -0,0 +1,94 @@
+"""
+Synthetic dataset generation for local benchmarking.
+
+Everything is written with bulk_create. Comment targets follow a Zipf-like
+distribution (a handful of posts get most of the discussion), and the
+denormalized comment counters on Post and the category/author statistics
+are filled in so the dataset starts consistent.
+"""
+import random
+import uuid
+from collections import Counter
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from django.utils.text import slugify
+from .models import Post, Comment, Category
+from . import stats
+
+WORDS = (
+    'django api cache index query postgres python serializer request response '
+    'latency throughput worker database migration cursor token search author '
+    'comment category blog deploy docker replica pool stream batch schema '
+    'render parser profile benchmark release design review feature bug fix '
+    'garden travel music coffee recipe weekend mountain river city library'
+).split()
+
+
+def sentence(rng, low=6, high=16):
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    return ' '.join(words).capitalize() + '.'
+
+
+def paragraph(rng, sentences):
+    return ' '.join(sentence(rng) for _ in range(sentences))
+
+
+def seed_dataset(users=100, categories=10, posts=1000, comments=10000,
+                 content_paragraphs=(3, 30), seed=None, batch_size=1000):
+    """Create the dataset and return the created objects keyed by model name."""
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    now = timezone.now()
+    User = get_user_model()
+
+    password = make_password('password')
+    created_users = User.objects.bulk_create([
+        User(email=f'seed-{run}-{i}@example.com', username=f'seed-{run}-{i}',
+             first_name=rng.choice(WORDS).capitalize(), password=password,
+             is_staff=i == 0, is_superuser=i == 0,
+             joined_at=now - timedelta(minutes=rng.randrange(1051200)))
+        for i in range(users)], batch_size=batch_size)
+    created_categories = Category.objects.bulk_create([
+        Category(name=f'{rng.choice(WORDS)} {run}-{i}') for i in range(categories)])
+
+    # decide where the comments go first so the counters are written with the posts
+    weights = [1 / (rank + 1) for rank in range(posts)]
+    targets = rng.choices(range(posts), weights=weights, k=comments)
+    comment_times = [now - timedelta(minutes=rng.randrange(525600)) for _ in targets]
+    counts = Counter(targets)
+    latest = {}
+    for index, created_at in zip(targets, comment_times):
+        latest[index] = max(created_at, latest.get(index, created_at))
+
+    post_objects = []
+    for i in range(posts):
+        title = sentence(rng, 3, 8).rstrip('.')
+        post_objects.append(Post(
+            title=title,
+            slug=f'{slugify(title)[:200]}-{run}-{i}',
+            excerpt=sentence(rng),
+            content='\n\n'.join(paragraph(rng, rng.randint(3, 8))
+                                for _ in range(rng.randint(*content_paragraphs))),
+            category=rng.choice(created_categories),
+            author=rng.choice(created_users),
+            status='published' if rng.random() < 0.9 else 'draft',
+            published=now - timedelta(minutes=rng.randrange(1051200)),
+            comment_count=counts.get(i, 0),
+            last_commented_at=latest.get(i)))
+    created_posts = Post.objects.bulk_create(post_objects, batch_size=batch_size)
+
+    Comment.objects.bulk_create((
+        Comment(post=created_posts[index], user=rng.choice(created_users),
+                comment=sentence(rng, 3, 30), created_at=created_at, updated_at=created_at)
+        for index, created_at in zip(targets, comment_times)), batch_size=batch_size)
+
+    # bulk_create sends no signals; the new posts only use the new categories and users
+    stats.refresh([category.pk for category in created_categories], [user.pk for user in created_users])
+
+    return {
+        'users': created_users,
+        'categories': created_categories,
+        'posts': created_posts,
+    }
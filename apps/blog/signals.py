@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Category, CategoryStats, AuthorStats, Comment, Post
+from . import stats
+
+# what blog.stats aggregates from a post
+COUNTED_FIELDS = ('status', 'category_id', 'author_id', 'published', 'comment_count')
+
+
+def _deletes(origin, model):
+    """Whether the delete started at `origin`, an instance or a queryset, is deleting `model` rows."""
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+def bulk_delete(queryset):
+    """
+    Delete `queryset` without the per-row post_delete upkeep (here and in blog_api.signals):
+    the caller updates the counters, stats and cache for the whole batch.
+    """
+    queryset.in_bulk_delete = True
+    return queryset.delete()
+
+
+def in_bulk_delete(origin):
+    return getattr(origin, 'in_bulk_delete', False)
+
+
+def remove_comments(post_id, count):
+    """Take `count` deleted comments off the counters of post `post_id` and its stats."""
+    latest = Comment.objects.filter(post=OuterRef('pk')).order_by('-created_at')
+    Post.objects.filter(pk=post_id).update(
+        comment_count=Greatest(F('comment_count') - count, Value(0)),
+        last_commented_at=Subquery(latest.values('created_at')[:1]),
+        updated_at=timezone.now())
+    stats.add_comments(post_id, -count)
+
+
+def recount_comments(post_ids):
+    """Recompute the comment counters of the posts `post_ids` from Comment, in one UPDATE."""
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    Post.objects.filter(pk__in=post_ids).update(
+        comment_count=Coalesce(Subquery(comments.values('post').annotate(n=Count('pk')).values('n')), 0),
+        last_commented_at=Subquery(comments.order_by('-created_at').values('created_at')[:1]),
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Category)
+def create_category_stats(sender, instance, created, raw=False, **kwargs):
+    # the row the incremental updates in blog.stats move
+    if created and not raw:
+        stats.create_rows(CategoryStats, 'category', [instance.pk])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.create_rows(AuthorStats, 'author', [instance.pk])
+
+
+# Post.save and Comment.save are atomic, so the handlers below write in the transaction of
+# the post or comment; bulk_create, bulk_update, update() and bulk_delete skip them and keep
+# the counters and stats current themselves, for the whole batch.
+
+@receiver(pre_save, sender=Post)
+def remember_counted_fields(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk is not None:
+        instance._counted = Post.objects.filter(pk=instance.pk).values_list(*COUNTED_FIELDS).first()
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = instance.__dict__.pop('_counted', None)
+    if created and before is None:
+        stats.add_post(instance)
+    elif before != tuple(getattr(instance, field) for field in COUNTED_FIELDS):
+        # the categories and authors the post moves out of and into
+        before = before or (None,) * len(COUNTED_FIELDS)
+        stats.refresh({before[1], instance.category_id}, {before[2], instance.author_id})
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, origin=None, **kwargs):
+    # a deleted author's posts are counted by uncount_author, once for all of them
+    if not in_bulk_delete(origin) and not _deletes(origin, get_user_model()):
+        stats.refresh([instance.category_id], [instance.author_id])
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # GREATEST skips NULL, so the first comment sets the timestamp
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1,
+            last_commented_at=Greatest('last_commented_at', Value(instance.created_at)),
+            updated_at=timezone.now())
+        stats.add_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    # deleted with its post, whose delete recomputes the stats, or with its author
+    if not (in_bulk_delete(origin) or _deletes(origin, Post) or _deletes(origin, get_user_model())):
+        remove_comments(instance.post_id, 1)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remember_authored(sender, instance, **kwargs):
+    # what the cascade takes along: the author's posts, and their comments on other posts
+    commented = Comment.objects.filter(user=instance).exclude(post__author=instance).order_by()
+    instance._authored = (
+        set(Post.objects.filter(author=instance).order_by().values_list('category_id', flat=True).distinct()),
+        set(commented.values_list('post_id', 'post__category_id', 'post__author_id').distinct()),
+    )
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def uncount_author(sender, instance, **kwargs):
+    categories, commented = instance.__dict__.pop('_authored', (set(), set()))
+    if commented:
+        recount_comments([post_id for post_id, _, _ in commented])
+    # the author's own stats row went with it
+    stats.refresh(categories | {category for _, category, _ in commented},
+                  {author for _, _, author in commented})
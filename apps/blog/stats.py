@@ -0,0 +1,97 @@
+"""
+Materialized per-category and per-author statistics.
+
+CategoryStats and AuthorStats hold the post count, the comment count and the
+latest publication date over the *published* posts of a category or author,
+so category menus and author cards read one row instead of scanning Post
+and Comment. The post_save and post_delete handlers in blog.signals keep
+them current in the transaction of every write, from the API, the admin or
+a cascade: comments move the counters by their delta, post writes recompute
+the rows of the categories and authors they touch, and deleting a user
+recomputes them once for everything the cascade removes. Writes that skip
+the handlers (bulk_create, bulk_update, update(), blog.signals.bulk_delete)
+call `refresh` or `add_comments` themselves, once per batch. `manage.py rebuild_stats` recomputes everything.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Category, CategoryStats, AuthorStats
+
+STAT_FIELDS = ['post_count', 'comment_count', 'latest_post_at']
+
+
+def _specs():
+    """(stats model, owner model, stats key, owner's reverse lookup of its posts)."""
+    return (
+        (CategoryStats, Category, 'category', 'post'),
+        (AuthorStats, get_user_model(), 'author', 'blog_posts'),
+    )
+
+
+def compute(stats_model, owners, key, posts):
+    """Unsaved stats rows of the `owners` queryset, aggregated from Post.comment_count, not Comment."""
+    published = Q(**{f'{posts}__status': 'published'})
+    rows = owners.order_by().annotate(
+        stat_post_count=Count(posts, filter=published),
+        stat_comment_count=Coalesce(Sum(f'{posts}__comment_count', filter=published), 0),
+        stat_latest_post_at=Max(f'{posts}__published', filter=published),
+    ).values_list('pk', 'stat_post_count', 'stat_comment_count', 'stat_latest_post_at')
+    return [stats_model(**{f'{key}_id': pk}, post_count=post_count, comment_count=comment_count,
+                        latest_post_at=latest_post_at)
+            for pk, post_count, comment_count, latest_post_at in rows]
+
+
+def _write(stats_model, owner, key, posts, ids, batch_size=1000):
+    ids = sorted(pk for pk in set(ids) if pk is not None)
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        rows = compute(stats_model, owner.objects.filter(pk__in=ids[start:start + batch_size]), key, posts)
+        stats_model.objects.bulk_create(rows, update_conflicts=True, unique_fields=[key], update_fields=STAT_FIELDS)
+        written += len(rows)
+    return written
+
+
+def refresh(categories=(), authors=()):
+    """Recompute the stats rows of the given category and author ids."""
+    for spec, ids in zip(_specs(), (categories, authors)):
+        _write(*spec, ids)
+
+
+def refresh_posts(posts):
+    """Recompute the stats of the categories and authors of `posts`."""
+    refresh({post.category_id for post in posts}, {post.author_id for post in posts})
+
+
+def add_post(post):
+    """Count a newly created post."""
+    if post.status != 'published':
+        return
+    for stats_model, _, key, _ in _specs():
+        stats_model.objects.filter(pk=getattr(post, f'{key}_id')).update(
+            post_count=F('post_count') + 1,
+            comment_count=F('comment_count') + post.comment_count,
+            # GREATEST skips NULL, so the first post sets the date
+            latest_post_at=Greatest('latest_post_at', Value(post.published)))
+
+
+def add_comments(post_id, delta):
+    """Move the comment counters of the category and author of post `post_id` by `delta`."""
+    for stats_model, _, key, posts in _specs():
+        stats_model.objects.filter(**{
+            f'{key}__{posts}__pk': post_id,
+            f'{key}__{posts}__status': 'published',
+        }).update(comment_count=Greatest(F('comment_count') + delta, Value(0)))
+
+
+def create_rows(stats_model, key, ids):
+    """Empty stats rows for new owners; existing rows are left alone."""
+    stats_model.objects.bulk_create(
+        [stats_model(**{f'{key}_id': pk}) for pk in ids], ignore_conflicts=True)
+
+
+def rebuild(batch_size=1000):
+    """Recompute every stats row; returns the number of rows written per stats model."""
+    return {
+        spec[0].__name__: _write(*spec, spec[1].objects.values_list('pk', flat=True), batch_size)
+        for spec in _specs()
+    }
@@ -0,0 +1,80 @@
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, Max, Sum
+from django.test import TestCase
+from .models import Post, Comment, Category, CategoryStats, AuthorStats
+from .seeding import seed_dataset
+
+
+class SeedDatasetTests(TestCase):
+    def test_seeded_counters_match_comments(self):
+        created = seed_dataset(users=5, categories=2, posts=30, comments=200, seed=1)
+        self.assertEqual(len(created['posts']), 30)
+        self.assertEqual(Comment.objects.count(), 200)
+        actual = dict(Comment.objects.values_list('post').annotate(n=Count('pk')))
+        for post in Post.objects.all():
+            self.assertEqual(post.comment_count, actual.get(post.pk, 0))
+        # skewed: the most discussed post carries a large share of the comments
+        self.assertGreater(max(actual.values()), 200 / 30 * 3)
+
+
+class StatsTests(TestCase):
+    def expected(self, stats_model, key):
+        posts = Post.objects.filter(status='published').order_by()
+        return {
+            row[f'{key}_id']: (row['n'], row['comments'], row['latest'])
+            for row in posts.values(f'{key}_id').annotate(
+                n=Count('pk'), comments=Sum('comment_count'), latest=Max('published'))
+        }
+
+    def actual(self, stats_model, key):
+        return {
+            getattr(row, f'{key}_id'): (row.post_count, row.comment_count, row.latest_post_at)
+            for row in stats_model.objects.filter(post_count__gt=0)
+        }
+
+    def test_seeded_stats_match_posts(self):
+        seed_dataset(users=5, categories=3, posts=40, comments=150, seed=2)
+        for stats_model, key in ((CategoryStats, 'category'), (AuthorStats, 'author')):
+            self.assertEqual(self.actual(stats_model, key), self.expected(stats_model, key))
+
+    def test_rebuild_fixes_drift(self):
+        seed_dataset(users=3, categories=2, posts=20, comments=50, seed=3)
+        CategoryStats.objects.update(post_count=0, comment_count=7)
+        AuthorStats.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertIn('CategoryStats', out.getvalue())
+        for stats_model, key in ((CategoryStats, 'category'), (AuthorStats, 'author')):
+            self.assertEqual(self.actual(stats_model, key), self.expected(stats_model, key))
+
+    def assertStatsCurrent(self):
+        for stats_model, key in ((CategoryStats, 'category'), (AuthorStats, 'author')):
+            self.assertEqual(self.actual(stats_model, key), self.expected(stats_model, key))
+
+    def test_model_writes_outside_the_api(self):
+        User = get_user_model()
+        author = User.objects.create_user('author@example.com', 'author', 'Author', 'password123')
+        reader = User.objects.create_user('reader@example.com', 'reader', 'Reader', 'password123')
+        general, news = Category.objects.create(name='general'), Category.objects.create(name='news')
+        post = Post.objects.create(title='one', slug='one', content='x', category=general, author=author)
+        other = Post.objects.create(title='two', slug='two', content='x', category=general, author=reader)
+        comments = [Comment.objects.create(post=post, user=reader, comment='hi'),
+                    Comment.objects.create(post=other, user=author, comment='hi'),
+                    Comment.objects.create(post=other, user=reader, comment='hi')]
+        self.assertStatsCurrent()
+        self.assertEqual(CategoryStats.objects.get(category=general).comment_count, 3)
+
+        post.category = news
+        post.save()
+        comments[2].delete()
+        self.assertStatsCurrent()
+        self.assertEqual(Post.objects.get(pk=other.pk).comment_count, 1)
+
+        # cascades: the author's post with its comment, and its comment on another post
+        author.delete()
+        self.assertStatsCurrent()
+        self.assertEqual(CategoryStats.objects.get(category=news).post_count, 0)
+        self.assertEqual(Post.objects.get(pk=other.pk).comment_count, 0)
+        self.assertEqual(CategoryStats.objects.get(category=general).comment_count, 0)
@@ -0,0 +1,131 @@
+"""
+Async versions of the hot read endpoints, for ASGI deployments.
+
+With ASYNC_READ_VIEWS on (the default under blogapp.asgi), GET and HEAD on
+post detail, the comment list and search are answered by the coroutines
+below; other methods, and the `.json`/`.api` suffix routes, still go to the
+regular DRF views. Responses are always JSON, with the same bodies, cache
+entries and validators as the sync views, so both modes share one cache.
+
+DRF's authentication and pagination are synchronous: authentication runs in
+the request's sync thread (JWT claims need no query), and search, whose
+paginators count and slice the queryset, builds its page there too. Post
+detail and comment reads use the async ORM directly, cache lookups the async
+cache API.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import URLPattern
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from blog.models import Post, Comment
+from . import cache
+from .conditional import aconditional, comment_list_validators, post_validators
+from .renderers import FastJSONRenderer
+from .serializers import PostSerializer, CommentSerializer
+from .views import search_posts
+
+
+def json_response(data, status=200):
+    response = HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+    response['Vary'] = 'Accept'
+    return response
+
+
+async def authenticate(request):
+    """DRF Request for `request`, or the 401 to return; authentication as configured for DRF views."""
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        user = await sync_to_async(lambda: drf_request.user)()
+        if not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+    except exceptions.APIException as ex:
+        response = json_response({'detail': ex.detail}, status=401)
+        response['WWW-Authenticate'] = authenticators[0].authenticate_header(drf_request)
+        return None, response
+    return drf_request, None
+
+
+async def post_detail(request, pk):
+    # PostViewSet.retrieve: readable without authentication
+    drf_request = Request(request)
+    pk = cache.post_pk(pk)
+    if pk is None:
+        return json_response({'detail': 'No Post matches the given query.'}, status=404)
+
+    async def respond():
+        async def serialize_post():
+            queryset = PostSerializer.sparse_queryset(Post.objects.all(), drf_request)
+            post = await queryset.aget(pk=pk)
+            return PostSerializer(post, context={'request': drf_request}).data
+
+        try:
+            data = await cache.aget_or_set(await cache.apost_detail_key(pk, request), serialize_post)
+        except Post.DoesNotExist:
+            return json_response({'detail': 'No Post matches the given query.'}, status=404)
+        return json_response(data)
+
+    return await aconditional(request, await sync_to_async(post_validators)(pk), respond)
+
+
+async def comment_list(request, post_id):
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    async def respond():
+        comments = [comment async for comment in Comment.objects.filter(post_id=post_id)]
+        return json_response(CommentSerializer(comments, many=True, context={'request': drf_request}).data)
+
+    return await aconditional(request, await sync_to_async(comment_list_validators)(post_id), respond)
+
+
+async def search(request, search_query):
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    async def produce():
+        return await sync_to_async(search_posts)(drf_request, search_query)
+
+    try:
+        key = await cache.apost_list_key(drf_request, scope='search')
+        return json_response(await cache.aget_or_set(key, produce))
+    except Exception as ex:
+        # same contract as views.search_for_blog
+        return json_response({'error': f'{str(ex)}'})
+
+
+ASYNC_READS = {
+    'post-detail': post_detail,
+    'comment-list': comment_list,
+    'search': search,
+}
+
+
+def async_reads(sync_view, async_view):
+    """View sending GET/HEAD to `async_view` and every other method to the DRF `sync_view`."""
+    sync_view_async = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view_async(request, *args, **kwargs)
+
+    # DRF views do their own CSRF checks for session authentication
+    view.csrf_exempt = True
+    # what the schema generator reads off DRF views
+    for attr in ('cls', 'initkwargs', 'actions'):
+        if hasattr(sync_view, attr):
+            setattr(view, attr, getattr(sync_view, attr))
+    return view
+
+
+def with_async_reads(pattern):
+    """`pattern` with its GET/HEAD served asynchronously, if it has an async version."""
+    async_view = ASYNC_READS.get(pattern.name)
+    if async_view is None or 'format' in pattern.pattern.regex.groupindex:
+        return pattern
+    return URLPattern(pattern.pattern, async_reads(pattern.callback, async_view), pattern.default_args, pattern.name)
@@ -0,0 +1,156 @@
+"""
+Batch create/update/delete for the blog viewsets.
+
+`BulkMixin` adds `POST|PATCH|DELETE <list url>/bulk/`:
+
+* POST takes a list of objects, validated one by one with the viewset's
+  serializer and written with a single `bulk_create`;
+* PATCH takes a list of partial objects with their `id`, written with a
+  single `bulk_update` of the fields that were sent;
+* DELETE takes a list of ids.
+
+Items are checked against `bulk_object_permission` like the detail routes
+check theirs. Every item gets a result (`index`, `status`, `id` or `errors`);
+the valid ones are written in one transaction, the others are skipped.
+bulk_create/bulk_update do not send model signals and deletes go through
+`blog.signals.bulk_delete`, which skips the per-row handlers, so the
+viewset hooks keep counters, stats and the post cache up to date
+themselves, once per batch.
+"""
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from . import cache
+
+
+def invalidate_posts(pks):
+    """Invalidate the cached posts `pks` and the post lists once the transaction commits."""
+    pks = set(pks)
+    if pks:
+        transaction.on_commit(partial(cache.invalidate_posts, pks))
+    transaction.on_commit(cache.invalidate_post_lists)
+
+
+def _result(index, code, **extra):
+    return {'index': index, 'status': code, **extra}
+
+
+class BulkMixin:
+    bulk_object_permission = None
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    @swagger_auto_schema(
+        operation_description=(
+            "Batch endpoint. POST creates a list of objects, PATCH updates a list of partial "
+            "objects identified by `id`, DELETE removes a list of ids. Valid items are written "
+            "in one transaction; every item gets its own status in `results`."),
+        request_body=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+        responses={
+            200: openapi.Response(description="Every item was updated or deleted"),
+            201: openapi.Response(description="Every item was created"),
+            207: openapi.Response(description="Some items failed, see `results`"),
+            400: openapi.Response(description="No item succeeded, or the body is not a list"),
+        }
+    )
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        max_items = getattr(settings, 'BULK_MAX_ITEMS', 1000)
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'expected a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > max_items:
+            return Response({'error': f'at most {max_items} items per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if request.method == 'POST':
+                results, success = self.bulk_create(items), status.HTTP_201_CREATED
+            elif request.method == 'PATCH':
+                results, success = self.bulk_update(items), status.HTTP_200_OK
+            else:
+                results, success = self.bulk_destroy(items), status.HTTP_204_NO_CONTENT
+
+        succeeded = sum(result['status'] == success for result in results)
+        if succeeded == len(results):
+            # like the single-object routes: 201 when everything was created
+            code = status.HTTP_201_CREATED if success == status.HTTP_201_CREATED else status.HTTP_200_OK
+        elif succeeded:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=code)
+
+    def bulk_create(self, items):
+        results, instances = [None] * len(items), []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                instances.append((index, self.build_bulk_instance(serializer.validated_data)))
+            else:
+                results[index] = _result(index, status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+        if instances:
+            self.perform_bulk_create([instance for _, instance in instances])
+        for index, instance in instances:
+            results[index] = _result(index, status.HTTP_201_CREATED, id=instance.pk)
+        return results
+
+    def bulk_update(self, items):
+        results = [None] * len(items)
+        objects = self._bulk_objects(items, results)
+        changed, fields = [], set()
+        for index, (obj, item) in objects.items():
+            serializer = self.get_serializer(obj, data=item, partial=True)
+            if not serializer.is_valid():
+                results[index] = _result(index, status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+                continue
+            for field, value in serializer.validated_data.items():
+                setattr(obj, field, value)
+            fields.update(serializer.validated_data)
+            changed.append((index, obj))
+        if changed and fields:
+            self.perform_bulk_update([obj for _, obj in changed], sorted(fields))
+        for index, obj in changed:
+            results[index] = _result(index, status.HTTP_200_OK, id=obj.pk)
+        return results
+
+    def bulk_destroy(self, items):
+        results = [None] * len(items)
+        items = [item if isinstance(item, dict) else {'id': item} for item in items]
+        objects = self._bulk_objects(items, results)
+        if objects:
+            self.perform_bulk_destroy([obj for obj, _ in objects.values()])
+        for index, (obj, _) in objects.items():
+            results[index] = _result(index, status.HTTP_204_NO_CONTENT, id=obj.pk)
+        return results
+
+    def _bulk_objects(self, items, results):
+        """{index: (locked object, item)} for the items the user may change; fills `results` for the rest."""
+        ids, seen = {}, set()
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                results[index] = _result(
+                    index, status.HTTP_400_BAD_REQUEST, errors={'id': ['An integer id is required.']})
+            elif pk in seen:
+                results[index] = _result(index, status.HTTP_400_BAD_REQUEST, errors={'id': ['Duplicate id.']})
+            else:
+                seen.add(pk)
+                ids[index] = pk
+        queryset = self.get_bulk_queryset().select_for_update(of=('self',))
+        found = queryset.in_bulk(ids.values())
+        permission = self.bulk_object_permission()
+        objects = {}
+        for index, pk in ids.items():
+            obj = found.get(pk)
+            if obj is None:
+                results[index] = _result(index, status.HTTP_404_NOT_FOUND, id=pk, errors={'detail': 'Not found.'})
+            elif not permission.has_object_permission(self.request, self, obj):
+                results[index] = _result(index, status.HTTP_403_FORBIDDEN, id=pk,
+                                         errors={'detail': permission.message})
+            else:
+                objects[index] = (obj, items[index])
+        return objects
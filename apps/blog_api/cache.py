@@ -0,0 +1,196 @@
+"""
+Read-through cache for serialized post payloads.
+
+Entries are keyed by the request URL (so `?fields=` variants are cached
+separately) under a generation number. Detail entries use a per-post
+generation, bumped when the post, one of its comments or its category (the
+name is embedded) changes. List entries (post list, author posts, search)
+share one generation, bumped by any write to Post, Comment or Category. Bumping a generation orphans every
+entry under it at once; see signals.py for the invalidation hooks. Post
+keys are built from the integer id, so `/posts/05/` shares post 5's
+generation. `post_cache_stats` serves the hit rate to staff.
+
+With read replicas, entries filled shortly after a bump read from the
+primary (see `route_fill`), a lagging replica would put the old rows under
+the new generation.
+"""
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from blogapp import routers
+
+_MISSING = object()
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+LIST_GENERATION_KEY = 'blog_api:posts:generation'
+# present while replicas may still be missing the latest post write
+RECENT_WRITE_KEY = 'blog_api:posts:recent-write'
+
+
+def get_post_cache():
+    return caches[settings.POST_CACHE_ALIAS]
+
+
+def _generation(key):
+    cache = get_post_cache()
+    generation = cache.get(key)
+    if generation is None:
+        # start from the clock so an evicted counter never reuses old keys
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+async def _ageneration(key):
+    cache = get_post_cache()
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, time.time_ns(), None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def _replica_window():
+    """Seconds a healthy replica may lag a commit: the lag bound, plus the time until a lag check notices more."""
+    return getattr(settings, 'REPLICA_MAX_LAG', 5) + getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 2)
+
+
+def _mark_write(cache):
+    # before the bump, so whoever sees the new generation sees the mark
+    if routers.replicas():
+        cache.set(RECENT_WRITE_KEY, 1, math.ceil(_replica_window()))
+
+
+def route_fill():
+    """Call before producing an entry to cache: reads go to the primary right after a post write."""
+    if routers.replicas() and get_post_cache().get(RECENT_WRITE_KEY) is not None:
+        routers.read_from_primary()
+
+
+async def aroute_fill():
+    if routers.replicas() and await get_post_cache().aget(RECENT_WRITE_KEY) is not None:
+        routers.read_from_primary()
+
+
+def _bump_generation(key):
+    cache = get_post_cache()
+    _mark_write(cache)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def _url_hash(request):
+    return hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def post_pk(pk):
+    """The id in a URL `pk` (`05` is post 5), None if it is not one; keys are built from ids only."""
+    pk = str(pk)
+    return int(pk) if pk.isascii() and pk.isdigit() else None
+
+
+def _post_generation_key(pk):
+    return f'blog_api:post:{int(pk)}:generation'
+
+
+def post_detail_key(pk, request):
+    generation = _generation(_post_generation_key(pk))
+    return f'blog_api:post:{int(pk)}:{generation}:{_url_hash(request)}'
+
+
+async def apost_detail_key(pk, request):
+    generation = await _ageneration(_post_generation_key(pk))
+    return f'blog_api:post:{int(pk)}:{generation}:{_url_hash(request)}'
+
+
+def post_validators_key(pk, scope):
+    """Key for the conditional GET validators of post `pk`, see conditional.py."""
+    generation = _generation(_post_generation_key(pk))
+    return f'blog_api:post:{int(pk)}:{generation}:validators:{scope}'
+
+
+def post_list_key(request, scope='posts'):
+    generation = _generation(LIST_GENERATION_KEY)
+    return f'blog_api:posts:{generation}:{scope}:{_url_hash(request)}'
+
+
+async def apost_list_key(request, scope='posts'):
+    generation = await _ageneration(LIST_GENERATION_KEY)
+    return f'blog_api:posts:{generation}:{scope}:{_url_hash(request)}'
+
+
+def get_or_set(key, producer):
+    """Return the cached payload for `key`, calling `producer` on a miss."""
+    cache = get_post_cache()
+    data = cache.get(key, _MISSING)
+    if data is not _MISSING:
+        _count('hits')
+        return data
+    _count('misses')
+    route_fill()
+    data = producer()
+    cache.set(key, data, settings.POST_CACHE_TIMEOUT)
+    return data
+
+
+async def aget_or_set(key, producer):
+    """`get_or_set` for async views, `producer` is a coroutine function."""
+    cache = get_post_cache()
+    data = await cache.aget(key, _MISSING)
+    if data is not _MISSING:
+        _count('hits')
+        return data
+    _count('misses')
+    await aroute_fill()
+    data = await producer()
+    await cache.aset(key, data, settings.POST_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_post(pk):
+    _bump_generation(_post_generation_key(pk))
+
+
+def invalidate_posts(pks):
+    """invalidate_post for many posts in one round trip: dropped generations restart from the clock."""
+    cache = get_post_cache()
+    _mark_write(cache)
+    cache.delete_many([_post_generation_key(pk) for pk in pks])
+
+
+def invalidate_post_lists():
+    _bump_generation(LIST_GENERATION_KEY)
+
+
+def cache_stats(reset=False):
+    """Payload lookups since start-up (or the last reset), with the hit rate."""
+    with _stats_lock:
+        stats = dict(_stats)
+        if reset:
+            _stats.update(hits=0, misses=0)
+    lookups = stats['hits'] + stats['misses']
+    return {**stats, 'hit_rate': round(stats['hits'] / lookups, 4) if lookups else None}
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def post_cache_stats(request):
+    """Post cache hits and misses of this process since start-up (or the last DELETE)."""
+    if request.method == 'DELETE':
+        cache_stats(reset=True)
+        return Response(status=204)
+    return Response(cache_stats())
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
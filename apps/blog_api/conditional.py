@@ -0,0 +1,115 @@
+"""
+Conditional GET (ETag / Last-Modified) for the read endpoints.
+
+Validators come from one small query on timestamps and counts, never from
+the serialized body. Post.updated_at moves on every post write and on every
+comment create/delete (they update the counters), Comment.updated_at on
+every comment edit. The post ETag also covers the category name (for
+`?expand=category`), Last-Modified does not. The post validators are kept in
+the post cache under the post's generation, which a category save bumps too,
+so a revalidation usually costs no query at all.
+Categories have no timestamps, their (small) list is hashed as rows, stats
+included.
+"""
+import hashlib
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from blog.models import Post, Category
+from . import cache
+
+_MISSING = object()
+
+
+def _etag(media_type, *parts):
+    digest = hashlib.md5(repr((media_type, *parts)).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def _latest(*moments):
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def _cached(pk, scope, producer):
+    # not through cache.get_or_set, its hit/miss stats are about payloads
+    pk = cache.post_pk(pk)
+    if pk is None:
+        return None
+    post_cache, key = cache.get_post_cache(), cache.post_validators_key(pk, scope)
+    validators = post_cache.get(key, _MISSING)
+    if validators is _MISSING:
+        cache.route_fill()
+        validators = producer(pk)
+        post_cache.set(key, validators, settings.POST_CACHE_TIMEOUT)
+    return validators
+
+
+def post_validators(pk):
+    """(etag parts, last_modified) of a post with its comments, or None if there is no such post."""
+    return _cached(pk, 'detail', _post_validators)
+
+
+def comment_list_validators(post_id):
+    return _cached(post_id, 'comments', _comment_list_validators)
+
+
+def _post_validators(pk):
+    row = Post.objects.filter(pk=pk).values('updated_at', 'category__name').annotate(
+        comments_updated=Max('posts__updated_at')).order_by('pk').first()
+    if row is None:
+        return None
+    return (row['updated_at'], row['comments_updated'], row['category__name']), \
+        _latest(row['updated_at'], row['comments_updated'])
+
+
+def _comment_list_validators(post_id):
+    row = Post.objects.filter(pk=post_id).values('updated_at').annotate(
+        comments=Count('posts'), comments_updated=Max('posts__updated_at')).order_by('pk').first()
+    if row is None:
+        return None
+    return (row['updated_at'], row['comments'], row['comments_updated']), \
+        _latest(row['updated_at'], row['comments_updated'])
+
+
+def category_list_validators():
+    rows = Category.objects.order_by('pk').values_list(
+        'pk', 'name', 'stats__post_count', 'stats__comment_count', 'stats__latest_post_at')
+    return tuple(rows), None
+
+
+def _prepare(request, validators, media_type):
+    parts, last_modified = validators
+    etag = _etag(media_type, parts)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _finish(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def conditional(request, validators, respond):
+    """
+    Answer 304 when the request's If-None-Match / If-Modified-Since match
+    `validators`, else call `respond()`; either way set ETag/Last-Modified.
+    `validators` of None (missing resource) always calls `respond()`.
+    """
+    if validators is None:
+        return respond()
+    # the representation also depends on the negotiated renderer
+    etag, timestamp, response = _prepare(request, validators, getattr(request, 'accepted_media_type', ''))
+    return _finish(response or respond(), etag, timestamp)
+
+
+async def aconditional(request, validators, respond, media_type='application/json'):
+    """`conditional` for async views, `respond` is a coroutine function."""
+    if validators is None:
+        return await respond()
+    etag, timestamp, response = _prepare(request, validators, media_type)
+    return _finish(response or await respond(), etag, timestamp)
@@ -0,0 +1,129 @@
+import json
+import logging
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from blog.models import Post
+from blog_api import cache
+from users.serializers import ClaimsTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the blog_api and users read endpoints through the test client against "
+        "the configured database (see `manage.py seed_data`) and report p50/p95/p99 "
+        "latency, queries per request and bytes per response."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Requests per endpoint.")
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', help="Staff username to authenticate as (default: first superuser).")
+        parser.add_argument('--cold', action='store_true', help="Invalidate the post cache before every request.")
+        parser.add_argument('--output', help="Write JSON results to this path.")
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        post = Post.objects.filter(comment_count__gt=0).order_by('-comment_count').first() or Post.objects.first()
+        if post is None:
+            raise CommandError('No posts found, run `manage.py seed_data` first.')
+
+        client = APIClient(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        word = post.title.split()[0].lower()
+        endpoints = {
+            'post_list_cursor': reverse('blog_api:post-list') + '?pagination=cursor',
+            'post_list_sparse': reverse('blog_api:post-list') + '?pagination=cursor&fields=id,title,excerpt',
+            'post_detail': reverse('blog_api:post-detail', args=[post.pk]),
+            'post_comments': reverse('blog_api:comment-list', args=[post.pk]),
+            'my_posts': reverse('blog_api:my_posts'),
+            'post_search': reverse('blog_api:search', args=[word]),
+            'categories': reverse('blog_api:category-list'),
+            'user_detail': reverse('users:user-detail', args=[user.pk]),
+            'author_search': reverse('users:authors_search', args=[user.first_name or user.username]),
+        }
+
+        # per-query SQL logging would dominate the timings
+        logging.getLogger('django.db.backends').setLevel(logging.WARNING)
+        cache.invalidate_post_lists()
+        results = {}
+        # one client repeating the same search would measure 429s
+        with override_settings(THROTTLE_SCOPES={}):
+            for name, url in endpoints.items():
+                results[name] = self.run_endpoint(client, url, post, options)
+                row = results[name]
+                self.stdout.write(
+                    f"{name:<18} p50 {row['p50_ms']:8.2f}ms  p95 {row['p95_ms']:8.2f}ms  "
+                    f"p99 {row['p99_ms']:8.2f}ms  {row['queries']:>3} queries  {row['bytes']:>9} bytes")
+
+        if options['output']:
+            report = {'meta': self.meta(options), 'endpoints': results}
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def get_user(self, username):
+        User = get_user_model()
+        if username:
+            return User.objects.get(username=username)
+        user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No superuser found, pass --user or run `manage.py seed_data` first.')
+        return user
+
+    def get(self, client, url):
+        response = client.get(url)
+        if not 200 <= response.status_code < 300:
+            raise CommandError(f'GET {url} returned {response.status_code}: {response.content[:200]!r}')
+        return response
+
+    def run_endpoint(self, client, url, post, options):
+        for _ in range(options['warmup']):
+            self.get(client, url)
+        timings, queries = [], []
+        for _ in range(options['requests']):
+            if options['cold']:
+                cache.invalidate_post_lists()
+                cache.invalidate_post(post.pk)
+            # reads may go to a replica (blogapp.routers), count the queries of every alias
+            with ExitStack() as stack:
+                captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                start = time.perf_counter()
+                response = self.get(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(sum(len(context) for context in captured))
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'queries': max(queries),
+            'bytes': len(response.content),
+        }
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': timezone.now().isoformat(),
+            'requests': options['requests'],
+            'cold_cache': options['cold'],
+            'posts': Post.objects.count(),
+        }
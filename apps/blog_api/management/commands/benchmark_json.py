@@ -0,0 +1,72 @@
+import io
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from blog.models import Post
+from blog_api.renderers import BACKENDS, FastJSONParser, FastJSONRenderer, load_backend
+from blog_api.serializers import PostSerializer
+from .benchmark_api import Command as BenchmarkApiCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Time FastJSONRenderer and FastJSONParser on PostSerializer output (posts with "
+        "their content and comments) for every installed JSON_BACKEND against the json "
+        "module, at several payload sizes. Fails if a backend renders different bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000], help="Posts per payload.")
+        parser.add_argument('--repeat', type=int, default=50, help="Timed runs per size and backend.")
+        parser.add_argument('--output', help="Write JSON results to this path.")
+
+    def handle(self, *args, **options):
+        backends = ['json', *(name for name in BACKENDS if load_backend(name) is not None)]
+        if len(backends) == 1:
+            self.stderr.write("No fast JSON backend installed, timing the json module only.")
+        results = []
+        for size in options['sizes']:
+            posts = list(Post.objects.prefetch_related('posts').order_by('-published', '-pk')[:size])
+            if not posts:
+                raise CommandError('No posts found, run `manage.py seed_data` first.')
+            data = PostSerializer(posts, many=True).data
+            rows = {name: self.measure(name, data, options['repeat']) for name in backends}
+            baseline = rows['json']
+            expected = baseline['body']
+            for name, row in rows.items():
+                if row.pop('body') != expected:
+                    raise CommandError(f'{name} renders {len(posts)} posts differently from the json module')
+                row['render_speedup'] = round(baseline['render_us'] / row['render_us'], 2)
+                row['parse_speedup'] = round(baseline['parse_us'] / row['parse_us'], 2)
+                self.stdout.write(
+                    f"{len(posts):>5} posts {row['bytes']:>9} bytes  {name:<7} render {row['render_us']:10.1f}us "
+                    f"({row['render_speedup']:4.1f}x)  parse {row['parse_us']:10.1f}us ({row['parse_speedup']:4.1f}x)")
+                results.append({'posts': len(posts), 'backend': name, **row})
+
+        if options['output']:
+            meta = BenchmarkApiCommand().meta({'requests': options['repeat'], 'cold': False})
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': meta, 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def measure(self, backend, data, repeat):
+        renderer, parser = FastJSONRenderer(), FastJSONParser()
+        with override_settings(JSON_BACKEND=backend):
+            body = renderer.render(data, 'application/json')
+            render, parse = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                renderer.render(data, 'application/json')
+                render.append((time.perf_counter() - start) * 1e6)
+                stream = io.BytesIO(body)
+                start = time.perf_counter()
+                parser.parse(stream, 'application/json')
+                parse.append((time.perf_counter() - start) * 1e6)
+        return {
+            'bytes': len(body),
+            'body': body,
+            'render_us': round(statistics.median(render), 1),
+            'parse_us': round(statistics.median(parse), 1),
+        }
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from blog.models import Post
+from users.serializers import ClaimsTokenObtainPairSerializer
+from .benchmark_api import Command as BenchmarkApiCommand
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI (gunicorn, blogapp.wsgi) and ASGI (uvicorn, blogapp.asgi) "
+        "serving modes under slow clients: while --slow clients trickle their request "
+        "headers, --fast clients hammer post detail, comment list and search. Reports "
+        "throughput and latency of the fast clients. Servers are started on free local "
+        "ports with the same worker count unless --wsgi-url/--asgi-url are given. "
+        "--pool both runs every server with and without the connection pool (DB_POOL), "
+        "use --slow 0 for plain throughput. --logins adds clients posting wrong passwords "
+        "to the token endpoint, to see what password hashing does to the other requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--pool', choices=['on', 'off', 'both'], default='on',
+                            help="Database connection pool of the started servers.")
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--fast', type=int, default=20, help="Concurrent well-behaved clients.")
+        parser.add_argument('--slow', type=int, default=50, help="Concurrent clients trickling their headers.")
+        parser.add_argument('--trickle-ms', type=int, default=200, help="Delay between header bytes of slow clients.")
+        parser.add_argument('--logins', type=int, default=0,
+                            help="Concurrent clients logging in with a wrong password.")
+        parser.add_argument('--hash-concurrency', type=int,
+                            help="PASSWORD_HASHING_CONCURRENCY of the started servers (default: theirs).")
+        parser.add_argument('--duration', type=float, default=15.0, help="Seconds per server.")
+        parser.add_argument('--timeout', type=float, default=10.0, help="Per-request timeout of fast clients.")
+        parser.add_argument('--user', help="Username to authenticate as (default: first superuser).")
+        parser.add_argument('--wsgi-url', help="Use an already running WSGI server.")
+        parser.add_argument('--asgi-url', help="Use an already running ASGI server.")
+        parser.add_argument('--output', help="Write JSON results to this path.")
+
+    def handle(self, *args, **options):
+        user = BenchmarkApiCommand().get_user(options['user'])
+        post = Post.objects.filter(comment_count__gt=0).order_by('-comment_count').first()
+        if post is None:
+            raise CommandError('No commented posts found, run `manage.py seed_data` first.')
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        paths = [
+            reverse('blog_api:post-detail', args=[post.pk]),
+            reverse('blog_api:comment-list', args=[post.pk]),
+            reverse('blog_api:search', args=[post.title.split()[0].lower()]),
+        ]
+        headers = {'Host': settings.ALLOWED_HOSTS[0], 'Authorization': f'Bearer {token}', 'Connection': 'close'}
+        # a full PBKDF2 verify per request, without a token to mint
+        login = self.request_bytes(
+            reverse('token_obtain_pair'), {'Host': headers['Host'], 'Content-Type': 'application/json',
+                                           'Connection': 'close'},
+            method='POST', body=json.dumps({'username': user.username, 'password': 'not-the-password'}).encode())
+
+        pools = {'on': [True], 'off': [False], 'both': [False, True]}[options['pool']]
+        results = {}
+        for mode in options['servers']:
+            for pool in pools:
+                name = f"{mode}{'' if pool else '-nopool'}"
+                with self.server(mode, options, pool) as base_url:
+                    results[name] = asyncio.run(self.run_load(base_url, paths, headers, options, login))
+                row = results[name]
+                self.stdout.write(
+                    f"{name:<12} {row['requests']:>6} ok  {row['errors']:>4} failed  {row['rps']:8.1f} req/s  "
+                    f"p50 {row['p50_ms']:8.1f}ms  p95 {row['p95_ms']:8.1f}ms  p99 {row['p99_ms']:8.1f}ms")
+                if options['logins']:
+                    self.stdout.write(f"{'':<12} {row['logins']:>6} logins answered, {row['logins_busy']} with 503")
+            if results.get(f'{mode}-nopool', {}).get('rps') and mode in results:
+                self.stdout.write(
+                    f"{mode} pool/no pool throughput: {results[mode]['rps'] / results[f'{mode}-nopool']['rps']:.1f}x")
+        if results.get('wsgi', {}).get('rps') and 'asgi' in results:
+            self.stdout.write(f"asgi/wsgi throughput: {results['asgi']['rps'] / results['wsgi']['rps']:.1f}x")
+
+        if options['output']:
+            report = {'meta': {**BenchmarkApiCommand().meta({'requests': None, 'cold': False}),
+                               **{key: options[key] for key in ('workers', 'fast', 'slow', 'trickle_ms', 'duration',
+                                                                'pool', 'logins', 'hash_concurrency')}},
+                      'modes': results}
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def server(self, mode, options, pool=True):
+        return _Server(mode, options, pool)
+
+    async def run_load(self, base_url, paths, headers, options, login=None):
+        url = urlsplit(base_url)
+        host, port = url.hostname, url.port or 80
+        deadline = time.monotonic() + options['duration']
+        latencies, errors = [], 0
+        logins = {401: 0, 503: 0}
+
+        async def slow_client():
+            # holds a connection (and, on a sync worker, the worker) while sending headers
+            request = self.request_bytes(paths[0], headers)
+            while time.monotonic() < deadline:
+                try:
+                    reader, writer = await asyncio.open_connection(host, port)
+                    for i in range(len(request) - 1):
+                        writer.write(request[i:i + 1])
+                        await writer.drain()
+                        await asyncio.sleep(options['trickle_ms'] / 1000)
+                        if time.monotonic() >= deadline:
+                            break
+                    writer.close()
+                except OSError:
+                    await asyncio.sleep(0.1)
+
+        async def fast_client(offset):
+            nonlocal errors
+            i = offset
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(
+                        self.fetch(host, port, self.request_bytes(path, headers)), options['timeout'])
+                except (OSError, asyncio.TimeoutError):
+                    status = None
+                if status == 200:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+
+        async def login_client():
+            while time.monotonic() < deadline:
+                try:
+                    status = await asyncio.wait_for(self.fetch(host, port, login), options['timeout'])
+                except (OSError, asyncio.TimeoutError):
+                    status = None
+                if status in logins:
+                    logins[status] += 1
+
+        started = time.monotonic()
+        await asyncio.gather(
+            *(slow_client() for _ in range(options['slow'])),
+            *(fast_client(i) for i in range(options['fast'])),
+            *(login_client() for _ in range(options['logins'] if login else 0)))
+        elapsed = time.monotonic() - started
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else [0] * 99
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(statistics.median(latencies), 3) if latencies else 0.0,
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'logins': logins[401] + logins[503],
+            'logins_busy': logins[503],
+        }
+
+    def request_bytes(self, path, headers, method='GET', body=b''):
+        if body:
+            headers = {**headers, 'Content-Length': len(body)}
+        lines = [f'{method} {path} HTTP/1.1', *(f'{name}: {value}' for name, value in headers.items()), '', '']
+        return '\r\n'.join(lines).encode() + body
+
+    async def fetch(self, host, port, request):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            # Connection: close, the body ends with the connection
+            while await reader.read(65536):
+                pass
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
+
+
+class _Server:
+    """Context manager yielding the base URL of a running server for `mode`."""
+
+    COMMANDS = {
+        'wsgi': ['gunicorn', 'blogapp.wsgi:application', '--workers', '{workers}', '--bind', '127.0.0.1:{port}',
+                 '--log-level', 'warning'],
+        'asgi': ['uvicorn', 'blogapp.asgi:application', '--workers', '{workers}', '--port', '{port}',
+                 '--log-level', 'warning', '--no-access-log'],
+    }
+
+    def __init__(self, mode, options, pool=True):
+        self.url = options[f'{mode}_url']
+        self.mode = mode
+        self.workers = options['workers']
+        # the same clients hammer search and login, throttling would answer most of them
+        self.env = {**os.environ, 'DEBUG': 'False', 'DB_POOL': str(pool),
+                    'THROTTLE_SEARCH_RATE': '1000000/s', 'THROTTLE_LOGIN_RATE': '1000000/s'}
+        if options['hash_concurrency']:
+            self.env['PASSWORD_HASHING_CONCURRENCY'] = str(options['hash_concurrency'])
+        self.process = None
+
+    def __enter__(self):
+        if self.url:
+            return self.url
+        port = free_port()
+        command = [part.format(workers=self.workers, port=port) for part in self.COMMANDS[self.mode]]
+        command[0] = os.path.join(os.path.dirname(sys.executable), command[0])
+        self.process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=self.env)
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            self.process.terminate()
+            raise CommandError(f'{self.mode} server did not start')
+        # let every worker finish importing the project
+        time.sleep(2)
+        return f'http://127.0.0.1:{port}'
+
+    def __exit__(self, *exc_info):
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=30)
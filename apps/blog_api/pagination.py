@@ -1,7 +1,36 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 
 class PostPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+class PostCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (published, id). No COUNT(*) and no OFFSET scan,
+    so the Nth page costs the same as the first one.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-published', '-id')
+
+
+class PostRankCursorPagination(PostCursorPagination):
+    """
+    Keyset pagination over the `rank` annotation of ranked search. The cursor carries the
+    last rank; posts sharing it are skipped by offset, in (published, id) order.
+    """
+    ordering = ('-rank', '-published', '-id')
+
+
+def get_post_paginator(request, default=PostPagination, cursor=PostCursorPagination):
+    """
+    Cursor mode is opt-in with `?pagination=cursor`. Pass the cursor class keyed on the
+    queryset's order, or cursor=None to stay on `default`.
+    """
+    if cursor and request.query_params.get('pagination') == 'cursor':
+        return cursor()
+    return default() if default else None
@@ -0,0 +1,101 @@
+"""
+JSON renderer and parser with a pluggable encoder.
+
+FastJSONRenderer and FastJSONParser produce and accept the same JSON as DRF's
+JSONRenderer and JSONParser, but encode and decode with orjson when it is
+installed (settings.JSON_BACKEND 'auto' or 'orjson'; 'json' forces the
+standard library). Types orjson has no native form for, or formats
+differently (datetime, date, time, Decimal, lazy strings, querysets), go
+through DRF's encoder, so they render exactly as before; UUIDs are native
+and identical.
+
+Whatever the fast backend rejects goes to DRF's implementation: indented
+output (the browsable API, `; indent=` in Accept), non-UTF-8 request bodies,
+integers beyond 64 bits, and invalid documents, which get DRF's ParseError
+message. Out of range floats (NaN, Infinity) are the one difference, orjson
+renders them as null where DRF raises.
+"""
+import codecs
+import functools
+import io
+import logging
+from collections import namedtuple
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+JSONBackend = namedtuple('JSONBackend', ['name', 'dumps', 'loads'])
+
+# orjson reads integers beyond 64 bits as floats, bodies with 19+ digit runs go to the json module;
+# mapping every digit to 0 and searching for a run is several times faster than a regex
+DIGITS_TO_ZERO = bytes.maketrans(b'123456789', b'000000000')
+LONG_NUMBER = b'0' * 19
+
+
+def _orjson():
+    import orjson
+    # datetimes go to `default`, DRF's encoder, so they keep its format ('Z', not '+00:00')
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    return JSONBackend('orjson', lambda data, default: orjson.dumps(data, default=default, option=options),
+                       orjson.loads)
+
+
+# fastest first, tried in this order by 'auto'
+BACKENDS = {'orjson': _orjson}
+
+
+@functools.lru_cache
+def load_backend(name):
+    """The JSONBackend called `name` ('auto' for the first installed one), None for the standard library."""
+    if name == 'json':
+        return None
+    for candidate in BACKENDS if name == 'auto' else [name]:
+        try:
+            return BACKENDS[candidate]()
+        except ImportError:
+            if name != 'auto':
+                logger.warning('JSON_BACKEND %s is not installed, using the json module', name)
+        except KeyError:
+            logger.warning('Unknown JSON_BACKEND %s, using the json module', name)
+    return None
+
+
+def get_backend():
+    return load_backend(getattr(settings, 'JSON_BACKEND', 'auto'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        backend = get_backend()
+        if (data is None or backend is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = backend.dumps(data, self.encoder_class().default)
+        except TypeError:
+            # unsupported by the backend (e.g. a 65 bit int); the json module renders it, or raises as before
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping as JSONRenderer, these are line terminators in JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        backend = get_backend()
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if backend is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if LONG_NUMBER not in body.translate(DIGITS_TO_ZERO):
+            try:
+                return backend.loads(body)
+            except ValueError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
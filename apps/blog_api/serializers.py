@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from blog.models import Post, Comment, Category
+from .sparse_fields import SparseFieldsMixin
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -9,17 +10,37 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'post', 'user']
 
 
-class PostSerializer(serializers.ModelSerializer):
+class CategorySerializer(serializers.ModelSerializer):
+    # blog.stats, select_related('stats') keeps them in the category query
+    post_count = serializers.IntegerField(source='stats.post_count', read_only=True)
+    comment_count = serializers.IntegerField(source='stats.comment_count', read_only=True)
+    latest_post_at = serializers.DateTimeField(source='stats.latest_post_at', read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'post_count', 'comment_count', 'latest_post_at']
+
+
+class PostCategorySerializer(serializers.ModelSerializer):
+    """The category expanded into posts, without the stats that would go stale in cached posts."""
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     comment = serializers.SerializerMethodField(read_only=True)
 
     def get_comment(self, obj):
-        comment = Comment.objects.filter(post=obj)
+        # served from the prefetch cache, see Meta.prefetch_fields
+        comment = obj.posts.all()
         serializer = CommentSerializer(comment, many=True)
         return serializer.data
 
     def create(self, validated_data):
         request = self.context.get('request')
-        if request and request.user.is_autenticated:
+        if request and request.user.is_authenticated:
             validated_data['author'] = request.user
         return super().create(validated_data)
 
@@ -30,10 +51,10 @@ class PostSerializer(serializers.ModelSerializer):
                   'excerpt',
                   'content',     # Main content
                   'category',    # Post category
+                  'comment_count',
+                  'last_commented_at',
                   'comment',]
-
-
-class CategorySerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Category
-        fields = '__all__'
+        read_only_fields = ['comment_count', 'last_commented_at']
+        expandable_fields = {'category': (PostCategorySerializer, 'category')}
+        prefetch_fields = {'comment': 'posts'}
+        required_columns = ['published']  # cursor pagination key
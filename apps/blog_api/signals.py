@@ -0,0 +1,39 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from blog.models import Post, Comment, Category
+from blog.signals import in_bulk_delete
+from . import cache
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post(sender, instance, origin=None, **kwargs):
+    # a bulk_delete invalidates its batch itself
+    if in_bulk_delete(origin):
+        return
+    transaction.on_commit(partial(cache.invalidate_post, instance.pk))
+    transaction.on_commit(cache.invalidate_post_lists)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_commented_post(sender, instance, origin=None, **kwargs):
+    if in_bulk_delete(origin):
+        return
+    transaction.on_commit(partial(cache.invalidate_post, instance.post_id))
+    transaction.on_commit(cache.invalidate_post_lists)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_post_lists(sender, instance, **kwargs):
+    transaction.on_commit(cache.invalidate_post_lists)
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_posts(sender, instance, created, **kwargs):
+    # detail payloads (?expand=category) and their ETags carry the name; a category
+    # with posts cannot be deleted (PROTECT), so only saves reach cached posts
+    if not created:
+        pks = list(Post.objects.filter(category=instance).values_list('pk', flat=True))
+        if pks:
+            transaction.on_commit(partial(cache.invalidate_posts, pks))
@@ -0,0 +1,63 @@
+def _query_param_set(request, name):
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return set()
+    value = request.query_params.get(name, '')
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for read requests.
+
+    `?fields=id,title` keeps only the listed fields, `?expand=category` swaps
+    the related id for the nested serializer listed in Meta.expandable_fields.
+    Use `sparse_queryset` in the view so unrequested columns and relations are
+    never loaded either.
+
+    Meta options:
+        expandable_fields: {name: (serializer_class, select_related lookup)}
+        prefetch_fields: {name: prefetch lookup needed to serialize `name`}
+        select_fields: {name: select_related lookup needed to serialize `name`}
+        required_columns: columns always loaded, e.g. the cursor pagination key
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = _query_param_set(request, 'fields')
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in _query_param_set(request, 'expand') & set(expandable):
+            if name in self.fields:
+                serializer_class, _ = expandable[name]
+                self.fields[name] = serializer_class(read_only=True)
+
+    @classmethod
+    def sparse_queryset(cls, queryset, request):
+        """Narrow `queryset` to what the requested representation needs."""
+        fields = cls(context={'request': request}).fields
+        meta = cls.Meta
+        for name, lookup in getattr(meta, 'prefetch_fields', {}).items():
+            if name in fields:
+                queryset = queryset.prefetch_related(lookup)
+        selected = {name: lookup for name, lookup in getattr(meta, 'select_fields', {}).items() if name in fields}
+        if selected:
+            queryset = queryset.select_related(*selected.values())
+        expandable = getattr(meta, 'expandable_fields', {})
+        for name in _query_param_set(request, 'expand') & set(expandable):
+            if name in fields:
+                queryset = queryset.select_related(expandable[name][1])
+
+        if not _query_param_set(request, 'fields'):
+            return queryset
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = {'pk', *getattr(meta, 'required_columns', ())}
+        for name, field in fields.items():
+            source = field.source.split('.')[0]
+            if source in model_fields:
+                columns.add(source)
+            elif name in selected:
+                columns.add(field.source.replace('.', '__'))
+        return queryset.only(*columns)
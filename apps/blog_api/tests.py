@@ -0,0 +1,965 @@
+import asyncio
+import csv
+import datetime
+import decimal
+import gzip
+import json
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from blog.models import Post, Comment, Category
+from blog.seeding import seed_dataset
+from blogapp import openapi, routers
+from blogapp.fileserver import ASGIFiles, FileServer, WSGIFiles
+from blogapp.instrumentation import registry
+from blogapp.staticfiles import CompressedManifestStaticFilesStorage
+from users.serializers import ClaimsTokenObtainPairSerializer
+from . import async_views, cache, export, renderers
+from .urls import router
+
+
+class PostCommentQueryCountTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        self.category = Category.objects.create(name='general')
+
+    def make_posts(self, posts, comments_per_post):
+        for i in range(posts):
+            post = Post.objects.create(
+                title=f'post {i}', slug=f'post-{i}', content='content',
+                category=self.category, author=self.admin)
+            Comment.objects.bulk_create([
+                Comment(post=post, user=self.admin, comment=f'comment {j}')
+                for j in range(comments_per_post)])
+
+    def test_post_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.admin)
+        for posts, comments in [(1, 1), (5, 3), (20, 10)]:
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.all().delete()
+                self.make_posts(posts, comments)
+            # one query for the posts, one for every comment on the page
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('blog_api:post-list'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), posts)
+            self.assertEqual(len(response.data[0]['comment']), comments)
+
+    def test_author_posts_query_count_is_constant(self):
+        self.client.force_authenticate(self.admin)
+        for posts, comments in [(2, 0), (15, 4)]:
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.all().delete()
+                self.make_posts(posts, comments)
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('blog_api:my_posts'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), posts)
+
+
+class PostCursorPaginationTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        category = Category.objects.create(name='general')
+        published = timezone.now()
+        # posts sharing a timestamp exercise the id tie-break
+        Post.objects.bulk_create([
+            Post(title=f'post {i}', slug=f'post-{i}', content='content',
+                 category=category, author=self.admin,
+                 published=published - timedelta(minutes=i // 2))
+            for i in range(25)])
+        self.client.force_authenticate(self.admin)
+
+    def test_cursor_pages_cover_every_post_once(self):
+        url = reverse('blog_api:post-list') + '?pagination=cursor&page_size=10'
+        seen = []
+        while url:
+            # posts + comments, and no COUNT(*) on any page
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        expected = list(Post.objects.order_by('-published', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_post_list_is_unpaginated_by_default(self):
+        response = self.client.get(reverse('blog_api:post-list'))
+        self.assertEqual(len(response.data), 25)
+
+
+class SearchForBlogTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            'reader@example.com', 'reader', 'Reader', 'password123')
+        category = Category.objects.create(name='general')
+        self.in_content = Post.objects.create(
+            title='Weekly notes', slug='weekly-notes', excerpt='misc',
+            content='We tuned the postgres planner this week.',
+            category=category, author=self.user)
+        self.in_title = Post.objects.create(
+            title='Postgres planner internals', slug='planner', excerpt='deep dive',
+            content='All about joins.', category=category, author=self.user)
+        Post.objects.create(
+            title='Gardening', slug='gardening', excerpt='tomatoes',
+            content='Nothing technical here.', category=category, author=self.user)
+        self.client.force_authenticate(self.user)
+
+    def test_search_matches_content_and_ranks_title_first(self):
+        response = self.client.get(reverse('blog_api:search', args=['planner']))
+        self.assertEqual(response.status_code, 200)
+        ids = [post['id'] for post in response.data['results']]
+        self.assertEqual(ids, [self.in_title.id, self.in_content.id])
+
+    def test_cursor_mode_keeps_rank_order(self):
+        # newest first would put in_content, published later, ahead of the title match
+        Post.objects.filter(pk=self.in_content.pk).update(published=self.in_title.published + timedelta(days=1))
+        response = self.client.get(reverse('blog_api:search', args=['planner']),
+                                   {'pagination': 'cursor', 'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertEqual([post['id'] for post in response.data['results']], [self.in_title.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([post['id'] for post in response.data['results']], [self.in_content.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_mode_pages_through_equal_ranks(self):
+        category = self.in_title.category
+        Post.objects.bulk_create([
+            Post(title=f'Planner {n}', slug=f'planner-{n}', content='x', category=category, author=self.user)
+            for n in range(5)])
+        url, ids = reverse('blog_api:search', args=['planner']), []
+        params = {'pagination': 'cursor', 'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            ids += [post['id'] for post in response.data['results']]
+            url, params = response.data['next'], None
+        expected = self.client.get(reverse('blog_api:search', args=['planner']), {'page_size': 100}).data
+        self.assertEqual(ids, [post['id'] for post in expected['results']])
+
+    def test_search_vector_follows_updates(self):
+        self.client.get(reverse('blog_api:search', args=['planner']))
+        self.in_content.content = 'Rewritten without the keyword.'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.in_content.save()
+        response = self.client.get(reverse('blog_api:search', args=['planner']))
+        ids = [post['id'] for post in response.data['results']]
+        self.assertEqual(ids, [self.in_title.id])
+
+    def test_reads_leave_out_the_search_vector(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('blog_api:search', args=['planner']))
+            self.client.get(reverse('blog_api:post-detail', args=[self.in_title.pk]))
+            list(self.user.blog_posts.all())
+        self.assertTrue(any('"blog_post"."title"' in query['sql'] for query in queries))
+        for query in queries:
+            # ranked and filtered on, never selected as a column
+            self.assertNotRegex(query['sql'], r'(SELECT|,) "blog_post"\."search_vector"(,| FROM)')
+
+
+class PostCacheTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        self.category = Category.objects.create(name='general')
+        self.post = Post.objects.create(
+            title='cached', slug='cached', content='content',
+            category=self.category, author=self.admin)
+        Comment.objects.create(post=self.post, user=self.admin, comment='first')
+        self.client.force_authenticate(self.admin)
+
+    def test_cached_responses_match_uncached_bytes(self):
+        for url in [reverse('blog_api:post-detail', args=[self.post.pk]),
+                    reverse('blog_api:post-list'),
+                    reverse('blog_api:post-list') + '?pagination=cursor',
+                    reverse('blog_api:my_posts')]:
+            before = cache.cache_stats()
+            miss = self.client.get(url)
+            with self.assertNumQueries(0):
+                hit = self.client.get(url)
+            after = cache.cache_stats()
+            self.assertEqual(hit.content, miss.content)
+            self.assertEqual(after['misses'] - before['misses'], 1)
+            self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_comment_write_invalidates_detail_and_lists(self):
+        detail = reverse('blog_api:post-detail', args=[self.post.pk])
+        self.client.get(detail)
+        self.client.get(reverse('blog_api:post-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('blog_api:comment-list', args=[self.post.pk]), {'comment': 'second'})
+        self.assertEqual(len(self.client.get(detail).data['comment']), 2)
+        self.assertEqual(len(self.client.get(reverse('blog_api:post-list')).data[0]['comment']), 2)
+
+    def test_post_delete_invalidates_detail(self):
+        detail = reverse('blog_api:post-detail', args=[self.post.pk])
+        self.client.get(detail)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        self.assertEqual(self.client.get(detail).status_code, 404)
+
+    def test_category_write_invalidates_lists(self):
+        self.client.get(reverse('blog_api:post-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'renamed'
+            self.category.save()
+        with self.assertNumQueries(2):
+            self.client.get(reverse('blog_api:post-list'))
+
+    def test_category_rename_invalidates_expanded_detail(self):
+        url = reverse('blog_api:post-detail', args=[self.post.pk])
+        self.client.get(url, {'expand': 'category'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'renamed'
+            self.category.save()
+        self.assertEqual(self.client.get(url, {'expand': 'category'}).data['category']['name'], 'renamed')
+
+    def test_padded_ids_share_the_post_generation(self):
+        padded = reverse('blog_api:post-detail', args=[f'0{self.post.pk}'])
+        response = self.client.get(padded)
+        self.assertEqual(response.data['title'], 'cached')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'edited'
+            self.post.save()
+        self.assertEqual(self.client.get(padded, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(padded).data['title'], 'edited')
+        self.assertEqual(self.client.get(reverse('blog_api:post-detail', args=['x1'])).status_code, 404)
+
+    def test_hit_rate_for_staff(self):
+        url = reverse('post_cache_stats')
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        detail = reverse('blog_api:post-detail', args=[self.post.pk])
+        for _ in range(4):
+            self.client.get(detail)
+        self.assertEqual(self.client.get(url).data, {'hits': 3, 'misses': 1, 'hit_rate': 0.75})
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            'reader@example.com', 'reader', 'Reader', 'password123'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class CommentCounterTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            'reader@example.com', 'reader', 'Reader', 'password123')
+        category = Category.objects.create(name='general')
+        self.post = Post.objects.create(
+            title='counted', slug='counted', content='content',
+            category=category, author=self.user)
+        self.client.force_authenticate(self.user)
+
+    def add_comment(self, text):
+        response = self.client.post(
+            reverse('blog_api:comment-list', args=[self.post.pk]), {'comment': text})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_counters_follow_create_and_destroy(self):
+        self.add_comment('first')
+        second = self.add_comment('second')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.last_commented_at, Comment.objects.get(pk=second).created_at)
+
+        self.client.delete(reverse('blog_api:comment-detail', args=[self.post.pk, second]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_commented_at, Comment.objects.get().created_at)
+
+
+class BenchmarkCommandTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        seed_dataset(users=3, categories=2, posts=20, comments=40, seed=5)
+        admin = get_user_model().objects.get(is_superuser=True)
+        Post.objects.filter(pk=Post.objects.order_by('pk').first().pk).update(author=admin)
+
+    def test_every_endpoint_answers_within_throttle_rates(self):
+        out = StringIO()
+        # more searches than the search scope allows
+        with override_settings(THROTTLE_RATES={**settings.THROTTLE_RATES, 'search': '2/min'}):
+            call_command('benchmark_api', requests=5, warmup=1, stdout=out)
+        self.assertIn('post_search', out.getvalue())
+        self.assertIn('author_search', out.getvalue())
+
+    def test_fails_on_error_responses(self):
+        reader = get_user_model().objects.filter(is_staff=False).first()
+        # the post list is admin only
+        with self.assertRaisesMessage(CommandError, 'returned 403'):
+            call_command('benchmark_api', requests=5, warmup=1, user=reader.username, stdout=StringIO())
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        self.category = Category.objects.create(name='general')
+        self.post = Post.objects.create(
+            title='sparse', slug='sparse', excerpt='short', content='x' * 5000,
+            category=self.category, author=self.admin)
+        Comment.objects.create(post=self.post, user=self.admin, comment='hidden')
+        self.client.force_authenticate(self.admin)
+
+    def test_fields_limits_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog_api:post-list'), {'fields': 'id,title,excerpt'})
+        self.assertEqual(response.data, [{'id': self.post.id, 'title': 'sparse', 'excerpt': 'short'}])
+        # comments are not prefetched and content is never selected
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"content"', queries[0]['sql'])
+
+    def test_expand_nests_category(self):
+        url = reverse('blog_api:post-detail', args=[self.post.pk])
+        response = self.client.get(url, {'fields': 'id,category', 'expand': 'category'})
+        self.assertEqual(response.data['category'], {'id': self.category.id, 'name': 'general'})
+        # variants are cached separately
+        self.assertEqual(self.client.get(url, {'fields': 'id,category'}).data['category'], self.category.id)
+
+    def test_default_representation_is_unchanged(self):
+        response = self.client.get(reverse('blog_api:post-detail', args=[self.post.pk]))
+        self.assertEqual(set(response.data), {
+            'id', 'title', 'excerpt', 'content', 'category',
+            'comment_count', 'last_commented_at', 'comment'})
+
+
+class RequestStatsTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        registry.reset()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        self.reader = User.objects.create_user(
+            'reader@example.com', 'reader', 'Reader', 'password123')
+        category = Category.objects.create(name='general')
+        self.post = Post.objects.create(
+            title='measured', slug='measured', content='content',
+            category=category, author=self.admin)
+
+    def test_records_queries_and_server_timing(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('blog_api:post-list'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="2 queries"$')
+
+        stats = self.client.get(reverse('view_stats')).data['GET blog_api:post-list']
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['queries_per_request'], 2)
+        self.assertEqual(stats['bytes_per_request'], len(response.content))
+        self.assertEqual(sum(stats['wall_ms']['histogram'].values()), 1)
+
+    def test_stats_are_admin_only(self):
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.get(reverse('view_stats')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('pool_stats')).status_code, 403)
+
+    @skipUnless(settings.DB_POOL, 'connection pool disabled')
+    def test_pool_stats(self):
+        self.client.force_authenticate(self.admin)
+        stats = self.client.get(reverse('pool_stats')).data['default']
+        self.assertEqual(stats['pool_max'], settings.DATABASES['default']['OPTIONS']['pool']['max_size'])
+        self.assertIn('wait_ms_per_request', stats)
+        self.assertEqual(self.client.delete(reverse('pool_stats')).status_code, 204)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        self.other = User.objects.create_user('other@example.com', 'other', 'Other', 'password123')
+        self.category = Category.objects.create(name='general')
+        now = timezone.now()
+        self.posts = Post.objects.bulk_create([
+            Post(title=f'post {i}', slug=f'post-{i}', content='content, "quoted"',
+                 category=self.category, author=self.admin if i % 2 else self.other,
+                 published=now - timedelta(days=i))
+            for i in range(7)])
+        Comment.objects.create(post=self.posts[0], user=self.other, comment='hi')
+        self.client.force_authenticate(self.admin)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse('blog_api:export', args=name.split('.')), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_filters(self):
+        since = (timezone.now() - timedelta(days=4)).isoformat()
+        lines = self.export('posts.ndjson', author=self.admin.pk, since=since).splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['post 1', 'post 3'])
+
+    def test_csv_streams_in_chunks(self):
+        response = self.client.get(reverse('blog_api:export', args=['posts', 'csv']))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:2], ['id', 'title'])
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[1][4], 'content, "quoted"')
+
+    def test_comment_export_and_invalid_filter(self):
+        lines = self.export('comments.ndjson', category=self.category.pk).splitlines()
+        self.assertEqual(json.loads(lines[0])['comment'], 'hi')
+        response = self.client.get(reverse('blog_api:export', args=['posts', 'csv']), {'until': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.get(reverse('blog_api:export', args=['posts', 'ndjson']))
+        self.assertEqual(response.status_code, 403)
+
+
+# committed rows: Django's ASGI handler runs the view in a thread of its own, with its own connection
+class ExportASGITests(APITransactionTestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser('admin@example.com', 'admin', 'Admin', 'password123')
+        category = Category.objects.create(name='general')
+        Post.objects.bulk_create([
+            Post(title=f'post {i}', slug=f'post-{i}', content='content', category=category, author=self.admin)
+            for i in range(7)])
+        self.token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_body_sent_while_rows_are_read(self):
+        events = []
+        chunks = export._chunks
+
+        def recorded_chunks(rows, chunk_size):
+            for chunk in chunks(rows, chunk_size):
+                events.append('read')
+                yield chunk
+
+        requests = [{'type': 'http.request', 'body': b''}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            # no disconnect while the response is sent
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and message.get('body'):
+                events.append('sent')
+                body.append(message['body'])
+
+        body = []
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': reverse('blog_api:export', args=['posts', 'ndjson']), 'query_string': b'',
+            'headers': [(b'authorization', f'Bearer {self.token}'.encode())], 'server': ('testserver', 80),
+        }
+        with mock.patch('blog_api.export._chunks', recorded_chunks):
+            await ASGIHandler()(scope, receive, send)
+        self.assertEqual(len(b''.join(body).splitlines()), 7)
+        self.assertEqual(events.count('read'), 4)
+        # a buffered body would be read to the end before the first message
+        self.assertLess(events.index('sent'), len(events) - events[::-1].index('read') - 1)
+
+
+class BulkEndpointTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.author = User.objects.create_user('author@example.com', 'author', 'Author', 'password123')
+        self.other = User.objects.create_user('other@example.com', 'other', 'Other', 'password123')
+        self.category = Category.objects.create(name='general')
+        self.post = Post.objects.create(
+            title='mine', slug='mine', content='content', category=self.category, author=self.author)
+        self.foreign = Post.objects.create(
+            title='theirs', slug='theirs', content='content', category=self.category, author=self.other)
+        self.client.force_authenticate(self.author)
+
+    def test_post_bulk_create_reports_per_item(self):
+        items = [{'title': f'new {i}', 'content': 'content', 'category': self.category.pk} for i in range(3)]
+        response = self.client.post(reverse('blog_api:post-bulk'), items + [{'title': 'no content'}], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 201, 201, 400])
+        self.assertEqual(Post.objects.filter(author=self.author, title__startswith='new').count(), 3)
+
+    def test_post_bulk_update_checks_permission_per_item(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('blog_api:post-bulk'), [
+                {'id': self.post.pk, 'title': 'renamed'},
+                {'id': self.foreign.pk, 'title': 'hijacked'},
+                {'id': 0, 'title': 'missing'},
+            ], format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], [200, 403, 404])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).title, 'renamed')
+        self.assertEqual(Post.objects.get(pk=self.foreign.pk).title, 'theirs')
+
+    def test_comment_bulk_keeps_counters(self):
+        url = reverse('blog_api:comment-bulk', args=[self.post.pk])
+        response = self.client.post(url, [{'comment': f'c{i}'} for i in range(5)], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 5)
+
+        ids = [result['id'] for result in response.data['results']]
+        response = self.client.delete(url, ids[:3], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.last_commented_at, Comment.objects.filter(post=self.post).latest(
+            'created_at').created_at)
+
+    def test_comment_bulk_query_count_is_constant(self):
+        url = reverse('blog_api:comment-bulk', args=[self.post.pk])
+        for size in (5, 50):
+            # locked post, insert, counter update, category and author stats
+            with self.assertNumQueries(5 + 2):  # + savepoint and release
+                self.client.post(url, [{'comment': 'c'}] * size, format='json')
+
+    def test_bulk_delete_query_count_is_constant(self):
+        comments = reverse('blog_api:comment-bulk', args=[self.post.pk])
+        for size in (5, 50):
+            ids = [result['id'] for result in self.client.post(
+                comments, [{'comment': 'c'}] * size, format='json').data['results']]
+            # locked comments, collected and deleted, counter update, category and author stats
+            with self.assertNumQueries(6 + 2):  # + savepoint and release
+                self.client.delete(comments, ids, format='json')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.post.last_commented_at), (0, None))
+
+        posts = reverse('blog_api:post-bulk')
+        for size in (5, 50):
+            ids = [result['id'] for result in self.client.post(posts, [
+                {'title': 't', 'content': 'c', 'category': self.category.pk}] * size, format='json').data['results']]
+            self.client.post(reverse('blog_api:comment-bulk', args=[ids[0]]), [{'comment': 'c'}] * 3, format='json')
+            # locked posts, posts and comments collected and deleted, category and author stats
+            with self.assertNumQueries(9 + 2):
+                self.client.delete(posts, ids, format='json')
+        self.assertEqual(self.category.stats.__class__.objects.get(pk=self.category.pk).post_count, 2)
+
+
+class CategoryAuthorStatsTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_superuser('author@example.com', 'author', 'Author', 'password123')
+        self.general = Category.objects.create(name='general')
+        self.news = Category.objects.create(name='news')
+        self.client.force_authenticate(self.author)
+
+    def stats(self, category):
+        category.stats.refresh_from_db()
+        self.author.stats.refresh_from_db()
+        return (category.stats.post_count, category.stats.comment_count,
+                self.author.stats.post_count, self.author.stats.comment_count)
+
+    def test_writes_maintain_stats(self):
+        response = self.client.post(reverse('blog_api:post-list'), {
+            'title': 'counted', 'content': 'content', 'category': self.general.pk})
+        post = Post.objects.get(pk=response.data['id'])
+        self.assertEqual(self.stats(self.general), (1, 0, 1, 0))
+        self.assertEqual(self.general.stats.latest_post_at, post.published)
+
+        comments = reverse('blog_api:comment-list', args=[post.pk])
+        self.client.post(comments, {'comment': 'one'})
+        self.client.post(reverse('blog_api:comment-bulk', args=[post.pk]), [{'comment': 'c'}] * 2, format='json')
+        comment = Comment.objects.filter(post=post).first()
+        self.client.delete(reverse('blog_api:comment-detail', args=[post.pk, comment.pk]))
+        self.assertEqual(self.stats(self.general), (1, 2, 1, 2))
+
+        self.client.patch(reverse('blog_api:post-detail', args=[post.pk]), {'category': self.news.pk})
+        self.assertEqual(self.stats(self.general), (0, 0, 1, 2))
+        self.assertEqual(self.stats(self.news), (1, 2, 1, 2))
+
+        self.client.delete(reverse('blog_api:post-detail', args=[post.pk]))
+        self.assertEqual(self.stats(self.news), (0, 0, 0, 0))
+        self.assertIsNone(self.news.stats.latest_post_at)
+
+    def test_serializers_expose_stats(self):
+        self.client.post(reverse('blog_api:post-list'), {
+            'title': 'counted', 'content': 'content', 'category': self.news.pk})
+        with self.assertNumQueries(2):  # validators, categories with their stats
+            response = self.client.get(reverse('blog_api:category-list'))
+        self.assertEqual([(row['name'], row['post_count']) for row in response.data], [('general', 0), ('news', 1)])
+
+        url = reverse('users:user-detail', args=[self.author.pk])
+        response = self.client.get(url, {'fields': 'id,post_count,comment_count'})
+        self.assertEqual(response.data, {'id': self.author.pk, 'post_count': 1, 'comment_count': 0})
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        self.category = Category.objects.create(name='general')
+        self.post = Post.objects.create(
+            title='polled', slug='polled', content='content', category=self.category, author=self.admin)
+        self.comment = Comment.objects.create(post=self.post, user=self.admin, comment='first')
+        self.client.force_authenticate(self.admin)
+
+    def assertRevalidates(self, url, change, queries=0):
+        response = self.client.get(url)
+        etag = response['ETag']
+        # validators only, nothing is serialized
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail(self):
+        url = reverse('blog_api:post-detail', args=[self.post.pk])
+        self.assertRevalidates(url, lambda: self.client.patch(
+            reverse('blog_api:comment-detail', args=[self.post.pk, self.comment.pk]), {'comment': 'edited'}))
+        self.assertRevalidates(url, lambda: self.client.patch(url, {'title': 'renamed'}))
+
+    def test_post_detail_after_category_rename(self):
+        def rename():
+            self.category.name = 'renamed'
+            self.category.save()
+        self.assertRevalidates(reverse('blog_api:post-detail', args=[self.post.pk]) + '?expand=category', rename)
+
+    def test_comment_list(self):
+        url = reverse('blog_api:comment-list', args=[self.post.pk])
+        self.assertRevalidates(url, lambda: self.client.delete(
+            reverse('blog_api:comment-detail', args=[self.post.pk, self.comment.pk])))
+
+    def test_category_list(self):
+        url = reverse('blog_api:category-list')
+        self.assertRevalidates(
+            url, lambda: Category.objects.filter(pk=self.category.pk).update(name='renamed'), queries=1)
+
+    def test_if_modified_since(self):
+        url = reverse('blog_api:post-detail', args=[self.post.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        caches[settings.POST_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'admin', 'Admin', 'password123')
+        category = Category.objects.create(name='general')
+        self.post = Post.objects.create(
+            title='async planner', slug='async', content='content', category=category, author=self.admin)
+        Comment.objects.create(post=self.post, user=self.admin, comment='first')
+        token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        self.auth = {'headers': {'Authorization': f'Bearer {token}'}}
+        self.factory = AsyncRequestFactory()
+
+    async def test_post_detail_matches_sync_view(self):
+        url = reverse('blog_api:post-detail', args=[self.post.pk])
+        sync = await sync_to_async(self.client.get)(url)
+        response = await async_views.post_detail(self.factory.get(url), pk=self.post.pk)
+        self.assertEqual(response.content, sync.content)
+        response = await async_views.post_detail(
+            self.factory.get(url, headers={'If-None-Match': sync['ETag']}), pk=self.post.pk)
+        self.assertEqual(response.status_code, 304)
+        response = await async_views.post_detail(self.factory.get(url), pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cache_keys_without_the_sync_cache_api(self):
+        request = self.factory.get(reverse('blog_api:post-detail', args=[self.post.pk]))
+        with mock.patch.object(cache, '_generation', side_effect=AssertionError('sync cache call')):
+            detail_key = await cache.apost_detail_key(self.post.pk, request)
+            list_key = await cache.apost_list_key(request, scope='search')
+        self.assertEqual(detail_key, await sync_to_async(cache.post_detail_key)(self.post.pk, request))
+        self.assertEqual(list_key, await sync_to_async(cache.post_list_key)(request, scope='search'))
+
+    async def test_comment_list_requires_authentication(self):
+        url = reverse('blog_api:comment-list', args=[self.post.pk])
+        response = await async_views.comment_list(self.factory.get(url), post_id=self.post.pk)
+        self.assertEqual(response.status_code, 401)
+        response = await async_views.comment_list(self.factory.get(url, **self.auth), post_id=self.post.pk)
+        self.assertEqual([comment['comment'] for comment in json.loads(response.content)], ['first'])
+
+    async def test_search(self):
+        url = reverse('blog_api:search', args=['planner'])
+        response = await async_views.search(self.factory.get(url, **self.auth), search_query='planner')
+        self.assertEqual(json.loads(response.content)['results'][0]['id'], self.post.pk)
+
+    def test_only_reads_of_mapped_routes_are_wrapped(self):
+        # the first pattern of each name, the others are the format suffix variants
+        patterns = {}
+        for pattern in router.urls:
+            patterns.setdefault(pattern.name, pattern)
+        detail = async_views.with_async_reads(patterns['post-detail'])
+        self.assertTrue(iscoroutinefunction(detail.callback))
+        self.assertIs(async_views.with_async_reads(patterns['post-list']), patterns['post-list'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], REPLICA_MAX_LAG=5, REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        routers.health.reset()
+        caches['default'].clear()
+        self.router = routers.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.lags = {'replica1': 0.5, 'replica2': 0.5}
+        patcher = mock.patch.object(routers.health, 'measure', side_effect=lambda alias: self.lags[alias])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, request, write=False):
+        """Aliases the reads of `request` go to, before and (with `write`) after a write."""
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Post))
+            if write:
+                self.router.db_for_write(Post)
+                reads.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        routers.ReplicaRoutingMiddleware(view)(request)
+        return reads
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_safe_requests_read_from_one_replica_until_they_write(self):
+        first, after_write = self.route(self.factory.get('/'), write=True)
+        self.assertIn(first, ['replica1', 'replica2'])
+        self.assertEqual(after_write, 'default')
+        self.assertEqual(self.route(self.factory.post('/')), ['default'])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        auth = {'HTTP_AUTHORIZATION': 'Bearer token'}
+        self.route(self.factory.post('/', **auth), write=True)
+        self.assertEqual(self.route(self.factory.get('/', **auth)), ['default'])
+        self.assertNotEqual(self.route(self.factory.get('/', HTTP_AUTHORIZATION='Bearer other')), ['default'])
+
+    def test_lagging_or_failing_replicas_are_skipped(self):
+        self.lags = {'replica1': 30.0, 'replica2': None}
+        self.assertEqual(self.route(self.factory.get('/')), ['default'])
+        self.assertEqual(routers.health.snapshot(), {'replica1': 30.0, 'replica2': None})
+        # not measured again before REPLICA_LAG_CHECK_INTERVAL
+        self.lags = {'replica1': 0.0, 'replica2': 0.0}
+        self.assertEqual(self.route(self.factory.get('/')), ['default'])
+
+    def test_cache_fills_read_the_primary_right_after_a_post_write(self):
+        reads = []
+
+        def view(request):
+            cache.get_or_set(cache.post_list_key(request), lambda: reads.append(self.router.db_for_read(Post)))
+            return HttpResponse()
+
+        auth = {'HTTP_AUTHORIZATION': 'Bearer token'}
+        routers.ReplicaRoutingMiddleware(view)(self.factory.get('/?before', **auth))
+        cache.invalidate_post_lists()
+        routers.ReplicaRoutingMiddleware(view)(self.factory.get('/?after', **auth))
+        # the mark expires after REPLICA_MAX_LAG + REPLICA_LAG_CHECK_INTERVAL; the client was not pinned
+        caches[settings.POST_CACHE_ALIAS].delete(cache.RECENT_WRITE_KEY)
+        routers.ReplicaRoutingMiddleware(view)(self.factory.get('/?later', **auth))
+        self.assertIn(reads[0], ['replica1', 'replica2'])
+        self.assertEqual(reads[1], 'default')
+        self.assertIn(reads[2], ['replica1', 'replica2'])
+
+    def test_replicas_are_never_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica1', 'blog'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'blog'))
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(DEBUG=False, OPENAPI_SCHEMA_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        openapi.store.reset()
+        self.addCleanup(openapi.store.reset)
+        self.url = reverse('schema-json', kwargs={'format': '.json'})
+
+    def test_served_precompressed_with_etag(self):
+        plain = self.client.get(self.url)
+        self.assertEqual(plain['Content-Type'], 'application/json')
+        self.assertIn('/api/posts/', json.loads(plain.content)['paths'])
+
+        compressed = self.client.get(self.url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+
+        response = self.client.get(self.url, headers={'If-None-Match': plain['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_generated_once_then_loaded_from_disk(self):
+        etag = self.client.get(self.url)['ETag']
+        openapi.store.reset()
+        with mock.patch.object(openapi.store, 'generate', side_effect=AssertionError('regenerated')):
+            self.assertEqual(self.client.get(self.url)['ETag'], etag)
+            self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.storage = CompressedManifestStaticFilesStorage(location=self.root, base_url='/static/')
+        self.css = b'body { color: #333; }\n' * 100
+        self.write('app.css', self.css)
+        list(self.storage.post_process({'app.css': (self.storage, 'app.css')}))
+        self.hashed = self.storage.hashed_files['app.css']
+        self.app = WSGIFiles(self.django_app, [
+            FileServer('/static/', self.root, 60, precompressed=True, immutable=frozenset([self.hashed])),
+            FileServer('/media/', self.root, 3600),
+        ])
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(data)
+
+    def django_app(self, environ, start_response):
+        start_response('200 OK', [])
+        return [b'django']
+
+    def get(self, path, method='GET', **headers):
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path,
+                   **{f"HTTP_{name.upper()}": value for name, value in headers.items()}}
+        started = {}
+
+        def start_response(status, response_headers):
+            started.update(status=int(status.split()[0]), headers=dict(response_headers))
+
+        body = b''.join(self.app(environ, start_response))
+        return started['status'], started['headers'], body
+
+    def test_collectstatic_writes_hashed_and_compressed_variants(self):
+        self.assertRegex(self.hashed, r'^app\.[0-9a-f]{12}\.css$')
+        with open(self.storage.path(self.hashed + '.gz'), 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), self.css)
+        self.assertTrue(os.path.exists(self.storage.path('app.css.gz')))
+
+    def test_hashed_names_are_immutable_and_precompressed(self):
+        status, headers, body = self.get(f'/static/{self.hashed}', ACCEPT_ENCODING='gzip')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), self.css)
+        self.assertEqual(int(headers['Content-Length']), len(body))
+
+        status, headers, body = self.get('/static/app.css')
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, self.css)
+
+        status, _, body = self.get('/static/app.css', IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual((status, body), (304, b''))
+
+    def test_range_requests(self):
+        self.write('avatar.jpg', bytes(range(256)) * 4)
+        status, headers, body = self.get('/media/avatar.jpg', RANGE='bytes=10-19')
+        self.assertEqual(status, 206)
+        self.assertEqual(headers['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(body, bytes(range(10, 20)))
+        self.assertEqual(headers['Content-Type'], 'image/jpeg')
+
+        self.assertEqual(self.get('/media/avatar.jpg', RANGE='bytes=-4')[2], bytes(range(252, 256)))
+        status, headers, _ = self.get('/media/avatar.jpg', RANGE='bytes=2000-')
+        self.assertEqual((status, headers['Content-Range']), (416, 'bytes */1024'))
+        # a stale If-Range gets the whole file
+        status, _, body = self.get('/media/avatar.jpg', RANGE='bytes=0-0', IF_RANGE='"stale"')
+        self.assertEqual((status, len(body)), (200, 1024))
+
+    def test_only_files_under_the_root(self):
+        self.assertEqual(self.get('/media/../app.css')[0], 404)
+        self.assertEqual(self.get('/media/missing.jpg')[0], 404)
+        self.assertEqual(self.get('/media/')[0], 404)
+        self.assertEqual(self.get('/media/app.css', method='POST')[0], 405)
+        self.assertEqual(self.get('/api/posts/')[2], b'django')
+
+    async def test_asgi_streams_range(self):
+        self.write('avatar.jpg', b'x' * 200000)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def django_app(scope, receive, send):
+            raise AssertionError('reached django')
+
+        app = ASGIFiles(django_app, self.app.servers)
+        scope = {'type': 'http', 'method': 'GET', 'path': '/media/avatar.jpg', 'headers': [(b'range', b'bytes=100-')]}
+        await app(scope, None, send)
+        self.assertEqual(sent[0]['status'], 206)
+        self.assertEqual(b''.join(message['body'] for message in sent[1:]), b'x' * 199900)
+        self.assertFalse(sent[-1]['more_body'])
+
+        sent.clear()
+        await app({**scope, 'extensions': {'http.response.zerocopysend': {}}}, None, send)
+        self.assertEqual((sent[1]['type'], sent[1]['offset'], sent[1]['count']),
+                         ('http.response.zerocopysend', 100, 199900))
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'published': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'naive': datetime.datetime(2024, 5, 1, 12, 30),
+        'day': datetime.date(2024, 5, 1),
+        'time': datetime.time(8, 15),
+        'elapsed': timedelta(seconds=90),
+        'price': decimal.Decimal('12.50'),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'big': 2 ** 70,
+        'text': 'caf\u00e9 \u2028',
+        7: [1.5, None, True],
+    }
+
+    def test_renders_what_drf_renders(self):
+        self.assertIsNotNone(renderers.get_backend())
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        # indented output is left to DRF
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data, 'application/json; indent=2'),
+                         JSONRenderer().render(self.data, 'application/json; indent=2'))
+
+    def test_parser(self):
+        parser = renderers.FastJSONParser()
+        self.assertEqual(parser.parse(BytesIO(b'{"title": "t", "n": [1, 2.5]}')), {'title': 't', 'n': [1, 2.5]})
+        # past 64 bits orjson would return a float
+        self.assertEqual(parser.parse(BytesIO(b'{"n": 123456789012345678901234567890}')),
+                         {'n': 123456789012345678901234567890})
+        for body in (b'{"n": NaN}', b'{"title": '):
+            with self.assertRaisesMessage(ParseError, 'JSON parse error'):
+                parser.parse(BytesIO(body))
+
+    @override_settings(JSON_BACKEND='simdjson')
+    def test_unknown_backend_falls_back_to_json_module(self):
+        self.assertIsNone(renderers.get_backend())
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(renderers.FastJSONParser().parse(BytesIO(b'[1]')), [1])
@@ -1,5 +1,6 @@
 from . import views
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 
 app_name = 'blog_api'
@@ -16,4 +17,12 @@ urlpatterns = [
     path('', include(router.urls)),
     path('all-my-posts/', views.AuthorPostsView.as_view(), name='my_posts'),
     path('search/<str:search_query>/', views.search_for_blog, name='search'),
+    re_path(r'^export/(?P<kind>posts|comments)\.(?P<fmt>ndjson|csv)$', views.export, name='export'),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import with_async_reads
+    urlpatterns = [
+        path('', include([with_async_reads(pattern) for pattern in router.urls])),
+        *map(with_async_reads, urlpatterns[1:]),
+    ]
@@ -1,3 +1,5 @@
+from blog import stats
+from blog.signals import bulk_delete, remove_comments
 from blog.models import Post, Category, Comment
 from .serializers import PostSerializer, CategorySerializer, CommentSerializer
 from rest_framework.response import Response
@@ -5,15 +7,25 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes
 from .custom_permissions import PostUserWritePermission, CommentUpdateOrDeletePermission
-from .pagination import PostPagination
-from django.db.models import Q
+from .pagination import PostRankCursorPagination, get_post_paginator
+from . import cache
+from .bulk import BulkMixin, invalidate_posts
+from .conditional import category_list_validators, comment_list_validators, conditional, post_validators
+from .export import CONTENT_TYPES, ExportFilterError, astream_rows, export_queryset, stream_rows
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Greatest
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from rest_framework.views import APIView
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    queryset = Category.objects.select_related('stats')
     serializer_class = CategorySerializer
     permission_classes = [IsAdminUser]
 
@@ -32,7 +44,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
                          operation_description="Retrieve a list of all categories available in the system.",
                          responses={200: CategorySerializer(many=True)})
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return conditional(request, category_list_validators(),
+                           lambda: super(CategoryViewSet, self).list(request, *args, **kwargs))
 
     @swagger_auto_schema(
         operation_summary="Create a new category",
@@ -78,24 +91,80 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(BulkMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
+    bulk_object_permission = PostUserWritePermission
+
+    def get_queryset(self):
+        return PostSerializer.sparse_queryset(super().get_queryset(), self.request)
+
+    @property
+    def paginator(self):
+        # the list stays unpaginated unless cursor mode is requested
+        if not hasattr(self, '_paginator'):
+            self._paginator = get_post_paginator(self.request, default=None)
+        return self._paginator
 
     def get_permissions(self):
         if self.action == 'list':
             return [IsAdminUser()]
-        elif self.action == 'create':
+        elif self.action in ['create', 'bulk']:
+            # bulk checks PostUserWritePermission per item
             return [IsAuthenticated()]
         else:
             return [PostUserWritePermission()]
 
+    def get_bulk_queryset(self):
+        return Post.objects.select_related('author')
+
+    def build_bulk_instance(self, validated_data):
+        return Post(author=self.request.user, **validated_data)
+
+    # category and author stats: bulk_create and bulk_update send no signals, bulk_delete skips
+    # the per-row handlers; each batch refreshes its categories and authors once, see blog.signals
+    def perform_bulk_create(self, posts):
+        Post.objects.bulk_create(posts)
+        stats.refresh_posts(posts)
+        invalidate_posts([])
+
+    def perform_bulk_update(self, posts, fields):
+        now = timezone.now()
+        for post in posts:
+            post.updated_at = now
+        counted = {'status', 'category', 'published'}.intersection(fields)
+        if counted:
+            # the stored rows, for the categories the posts move out of
+            before = list(Post.objects.filter(pk__in=[post.pk for post in posts]).only('category_id', 'author_id'))
+        Post.objects.bulk_update(posts, [*fields, 'updated_at'])
+        if counted:
+            stats.refresh_posts([*before, *posts])
+        invalidate_posts([post.pk for post in posts])
+
+    def perform_bulk_destroy(self, posts):
+        pks = [post.pk for post in posts]
+        bulk_delete(Post.objects.filter(pk__in=pks))
+        stats.refresh_posts(posts)
+        invalidate_posts(pks)
+
     @swagger_auto_schema(
         operation_description="Retrieve a list of all posts. Admin access is required.",
+        manual_parameters=[
+            openapi.Parameter(
+                'pagination',
+                openapi.IN_QUERY,
+                description="Set to `cursor` for keyset pagination on (published, id).",
+                type=openapi.TYPE_STRING,
+                enum=['cursor'],
+            ),
+        ],
         responses={200: PostSerializer(many=True)},
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        data = cache.get_or_set(
+            cache.post_list_key(request),
+            lambda: super(PostViewSet, self).list(request, *args, **kwargs).data)
+        return Response(data)
 
     @swagger_auto_schema(
         operation_description="Create a new post. Requires user authentication.",
@@ -116,7 +185,18 @@ class PostViewSet(viewsets.ModelViewSet):
         },
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        pk = cache.post_pk(kwargs['pk'])
+        if pk is None:
+            # not an id, the lookup answers 404
+            return super().retrieve(request, *args, **kwargs)
+
+        def respond():
+            data = cache.get_or_set(
+                cache.post_detail_key(pk, request),
+                lambda: super(PostViewSet, self).retrieve(request, *args, **kwargs).data)
+            return Response(data)
+
+        return conditional(request, post_validators(pk), respond)
 
     @swagger_auto_schema(
         operation_description="Update a specific post by its ID. Requires appropriate permissions.",
@@ -165,11 +245,15 @@ class AuthorPostsView(APIView):
         tags=["Posts"],
     )
     def get(self, request):
-        post = Post.objects.filter(author=request.user)
+        def serialize_posts():
+            post = PostSerializer.sparse_queryset(Post.objects.filter(author=request.user), request)
+            return PostSerializer(post, many=True, context={'request': request}).data
+
         try:
-            if post:
-                serializer = PostSerializer(post, many=True)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+            data = cache.get_or_set(
+                cache.post_list_key(request, scope=f'author:{request.user.pk}'), serialize_posts)
+            if data:
+                return Response(data, status=status.HTTP_200_OK)
             else:
                 return Response({'message': 'You do not have posts yet.'},
                                 status=status.HTTP_404_NOT_FOUND)
@@ -177,22 +261,44 @@ class AuthorPostsView(APIView):
             return Response({'error': f'{str(ex)}'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-@permission_classes([IsAuthenticated])
+def search_posts(request, search_query):
+    """Serialized page of posts matching `search_query`, ranked; `?pagination=cursor` keys on the rank."""
+    query = SearchQuery(search_query, search_type='websearch', config='english')
+    posts = Post.objects.filter(search_vector=query).annotate(
+        # ts_rank is a real, read back rounded; as a double the cursor's rank compares equal to the row's
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+    ).order_by('-rank', '-published', '-id')
+    posts = PostSerializer.sparse_queryset(posts, request)
+    paginator = get_post_paginator(request, cursor=PostRankCursorPagination)
+    paginated_posts = paginator.paginate_queryset(posts, request)
+    serializer = PostSerializer(paginated_posts, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data).data
+
+
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
 @swagger_auto_schema(
-    summary="Search for blogs by title or slug",
+    summary="Full-text search over blogs",
     description=(
         "This endpoint allows users to search for blogs by providing a query. "
-        "It performs a case-insensitive search in the `title` or `slug` fields of posts."
+        "It runs a ranked full-text search over the `title`, `excerpt` and `content` "
+        "fields of posts, with title matches weighted highest."
     ),
     parameters=[
         {
             "name": "search_query",
             "required": True,
             "in": "query",
-            "description": "The search term to look for in blog titles or slugs.",
+            "description": "Search terms, in web search syntax (quotes, `or`, `-word`).",
             "schema": {"type": "string"},
-        }
+        },
+        {
+            "name": "pagination",
+            "required": False,
+            "in": "query",
+            "description": "Set to `cursor` for keyset pagination on the rank.",
+            "schema": {"type": "string", "enum": ["cursor"]},
+        },
     ],
     responses={
         200: PostSerializer(many=True),  # Successful response with matching posts
@@ -209,13 +315,8 @@ class AuthorPostsView(APIView):
 )
 def search_for_blog(request, search_query):
     try:
-        posts = Post.objects.filter(
-            Q(title__icontains=search_query) | Q(slug__icontains=search_query)
-        ).select_related('author')
-        paginator = PostPagination()
-        paginated_posts = paginator.paginate_queryset(posts, request)
-        serializer = PostSerializer(paginated_posts, many=True)
-        return paginator.get_paginated_response(serializer.data, status=status.HTTP_200_OK)
+        return Response(cache.get_or_set(
+            cache.post_list_key(request, scope='search'), lambda: search_posts(request, search_query)))
     except Post.DoesNotExist:
         return Response({'message': 'no similar blogs'},
                         status=status.HTTP_404_NOT_FOUND)
@@ -223,12 +324,50 @@ def search_for_blog(request, search_query):
         return Response({'error': f'{str(ex)}'})
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@swagger_auto_schema(
+    operation_summary="Export posts or comments",
+    operation_description=(
+        "Streams every matching post (`posts.ndjson`, `posts.csv`) or comment "
+        "(`comments.ndjson`, `comments.csv`) ordered by id. Admin access is required."
+    ),
+    manual_parameters=[
+        openapi.Parameter('author', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Post author id, or comment author id for comments."),
+        openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Category id (of the commented post for comments)."),
+        openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description="ISO 8601 date or datetime, inclusive. Posts filter on "
+                                      "`published`, comments on `created_at`."),
+        openapi.Parameter('until', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description="ISO 8601 date or datetime, exclusive; a date includes that day."),
+    ],
+    responses={
+        200: openapi.Response(description="NDJSON or CSV stream"),
+        400: openapi.Response(description="Invalid filter",
+                              examples={"application/json": {"error": "author must be an integer id"}}),
+    },
+)
+def export(request, kind, fmt):
+    try:
+        queryset, columns = export_queryset(kind, request.query_params)
+    except ExportFilterError as ex:
+        return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+    stream = astream_rows if isinstance(request._request, ASGIRequest) else stream_rows
+    response = StreamingHttpResponse(stream(queryset, columns, fmt), content_type=CONTENT_TYPES[fmt])
+    filename = f'{kind}-{timezone.now():%Y%m%d-%H%M%S}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class CommentViewSet(BulkMixin, viewsets.ModelViewSet):
     """
     A viewset for managing comments on specific posts.
     """
 
     serializer_class = CommentSerializer
+    bulk_object_permission = CommentUpdateOrDeletePermission
 
     def get_queryset(self):
         post_id = self.kwargs.get('post_id')
@@ -243,11 +382,46 @@ class CommentViewSet(viewsets.ModelViewSet):
         },
     )
     def perform_create(self, serializer):
+        # the post's counters and blog.stats follow in the same transaction, see blog.signals
+        serializer.save(user=self.request.user, post_id=self.kwargs.get('post_id'))
+
+    def perform_update(self, serializer):
+        serializer.save(updated_at=timezone.now())
+
+    def get_bulk_queryset(self):
+        return self.get_queryset().select_related('user')
+
+    def build_bulk_instance(self, validated_data):
+        return Comment(user=self.request.user, post_id=self.kwargs.get('post_id'), **validated_data)
+
+    def perform_bulk_create(self, comments):
+        post_id = self.kwargs.get('post_id')
+        get_object_or_404(Post.objects.select_for_update(), pk=post_id)
+        Comment.objects.bulk_create(comments)
+        Post.objects.filter(pk=post_id).update(
+            comment_count=F('comment_count') + len(comments),
+            last_commented_at=Greatest(
+                'last_commented_at', Value(max(comment.created_at for comment in comments))),
+            updated_at=timezone.now())
+        stats.add_comments(post_id, len(comments))
+        invalidate_posts([post_id])
+
+    def perform_bulk_update(self, comments, fields):
+        now = timezone.now()
+        for comment in comments:
+            comment.updated_at = now
+        Comment.objects.bulk_update(comments, [*fields, 'updated_at'])
+        invalidate_posts([self.kwargs.get('post_id')])
+
+    def perform_bulk_destroy(self, comments):
         post_id = self.kwargs.get('post_id')
-        serializer.save(user=self.request.user, post_id=post_id)
+        bulk_delete(Comment.objects.filter(pk__in=[comment.pk for comment in comments]))
+        remove_comments(post_id, len(comments))
+        invalidate_posts([post_id])
 
     def get_permissions(self):
-        if self.action in ['list', 'create', 'retrieve']:
+        if self.action in ['list', 'create', 'retrieve', 'bulk']:
+            # bulk checks CommentUpdateOrDeletePermission per item
             return [IsAuthenticated()]
         else:
             return [CommentUpdateOrDeletePermission()]
@@ -257,7 +431,8 @@ class CommentViewSet(viewsets.ModelViewSet):
         responses={200: CommentSerializer(many=True)},
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return conditional(request, comment_list_validators(kwargs.get('post_id')),
+                           lambda: super(CommentViewSet, self).list(request, *args, **kwargs))
 
     @swagger_auto_schema(
         operation_description="Retrieve a specific comment for a post.",
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from .models import NewUser, TokenClaimsUser
+
+
+class UserRowCache:
+    """Small in-process LRU of full NewUser rows with a short TTL."""
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(pk)
+            if entry is not None and entry[0] > now:
+                self._rows.move_to_end(pk)
+                return entry[1]
+        row = NewUser.objects.get(pk=pk)
+        with self._lock:
+            self._rows[pk] = (now + self.ttl, row)
+            self._rows.move_to_end(pk)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+        return row
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._rows.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+user_row_cache = UserRowCache(
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 30),
+    maxsize=getattr(settings, 'JWT_USER_CACHE_SIZE', 1024))
+
+
+def user_claims(user):
+    """Claims stamped into tokens, besides the user id."""
+    return {name: getattr(user, name) for name in TokenClaimsUser.CLAIM_FIELDS if name != 'id'}
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the is_staff/is_active claims stamped by
+    ClaimsTokenObtainPairSerializer and returns a lazy TokenClaimsUser instead
+    of loading the user row. Tokens issued without the claims fall back to the
+    regular lookup.
+    """
+
+    def get_user(self, validated_token):
+        claims = {'id': validated_token.get(api_settings.USER_ID_CLAIM)}
+        claims.update((name, validated_token.get(name)) for name in TokenClaimsUser.CLAIM_FIELDS if name != 'id')
+        if None in claims.values():
+            return super().get_user(validated_token)
+        if not claims['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return TokenClaimsUser.from_claims(claims)
@@ -0,0 +1,17 @@
+from django.db import IntegrityError
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.views import exception_handler as drf_exception_handler
+from .models import NewUser, TokenClaimsUser
+
+
+def exception_handler(exc, context):
+    """
+    DRF's handler, and a 401 for writes that fail on a foreign key to a user deleted while
+    their access token is still valid: ClaimsJWTAuthentication never loads the row.
+    """
+    if isinstance(exc, IntegrityError):
+        user = getattr(context.get('request'), 'user', None)
+        if isinstance(user, TokenClaimsUser) and not NewUser.objects.filter(pk=user.pk).exists():
+            exc = AuthenticationFailed(_("User not found"), code="user_not_found")
+    return drf_exception_handler(exc, context)
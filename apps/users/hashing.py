@@ -0,0 +1,191 @@
+"""
+Password hashing on a bounded executor.
+
+PBKDF2 is CPU bound and hashlib releases the GIL while it runs, so every
+login, signup or password change in flight keeps a core busy for the whole
+hash. BoundedPBKDF2PasswordHasher, first in PASSWORD_HASHERS, runs the
+PBKDF2 work of hashing and verifying on a per-process pool of
+PASSWORD_HASHING_CONCURRENCY threads. A caller waits at most
+PASSWORD_HASHING_QUEUE_TIMEOUT seconds for a free thread and then gets a 503
+with Retry-After (HashingBusy), so a login storm takes that many cores and
+leaves the others to the rest of the API. Pooled database connections
+(settings.DB_POOL) go back to the pool while a request queues and hashes.
+
+The work factor is PASSWORD_HASH_ITERATIONS (`manage.py tune_password_hasher`
+measures one for a target time). A password stored with another iteration
+count is re-hashed on the next successful login, as Django does for its own
+hashers via `must_update`.
+
+`password_hashing_stats` serves per operation counts, hash and queue wait
+times, and rejections.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_lazy as _
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from blogapp.instrumentation import LATENCY_BUCKETS_MS
+
+
+class HashingBusy(APIException):
+    status_code = 503
+    default_detail = _('Too many password checks in progress, try again shortly.')
+    default_code = 'hashing_busy'
+
+    def __init__(self, wait):
+        super().__init__()
+        # DRF's exception handler sends it as Retry-After
+        self.wait = wait
+
+
+class HashingStats:
+    __slots__ = ('count', 'hash_ms', 'max_hash_ms', 'wait_ms', 'max_wait_ms', 'rejected', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.hash_ms = 0.0
+        self.max_hash_ms = 0.0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.rejected = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, hash_ms, wait_ms):
+        self.count += 1
+        self.hash_ms += hash_ms
+        self.max_hash_ms = max(self.max_hash_ms, hash_ms)
+        self.wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, hash_ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of hashes."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, hits in zip(LATENCY_BUCKETS_MS, self.histogram):
+            seen += hits
+            if seen >= rank:
+                return bound
+        return self.max_hash_ms
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'rejected': self.rejected,
+            'hash_ms': {
+                'mean': round(self.hash_ms / count, 3),
+                'max': round(self.max_hash_ms, 3),
+                'p50': self.percentile(0.5) if self.count else 0,
+                'p95': self.percentile(0.95) if self.count else 0,
+            },
+            'wait_ms': {
+                'mean': round(self.wait_ms / count, 3),
+                'max': round(self.max_wait_ms, 3),
+            },
+        }
+
+
+class HashingExecutor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._slots = None
+        self._pid = None
+        self._stats = {}
+
+    def _ensure_pool(self):
+        # per process: a worker forked after the first hash starts its own threads
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    concurrency = max(1, getattr(settings, 'PASSWORD_HASHING_CONCURRENCY', 1))
+                    self._slots = threading.BoundedSemaphore(concurrency)
+                    self._pool = ThreadPoolExecutor(concurrency, thread_name_prefix='password-hash')
+                    self._pid = os.getpid()
+        return self._pool, self._slots
+
+    def run(self, operation, fn, *args):
+        """fn(*args) on the pool, raising HashingBusy if no thread frees up within the queue timeout."""
+        pool, slots = self._ensure_pool()
+        release_pooled_connections()
+        timeout = getattr(settings, 'PASSWORD_HASHING_QUEUE_TIMEOUT', 5)
+        queued = time.perf_counter()
+        if not slots.acquire(timeout=timeout):
+            with self._lock:
+                self._stats.setdefault(operation, HashingStats()).rejected += 1
+            raise HashingBusy(max(1, math.ceil(timeout)))
+        try:
+            started = time.perf_counter()
+            result = pool.submit(fn, *args).result()
+            finished = time.perf_counter()
+        finally:
+            slots.release()
+        with self._lock:
+            self._stats.setdefault(operation, HashingStats()).add(
+                (finished - started) * 1000, (started - queued) * 1000)
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {operation: stats.as_dict() for operation, stats in sorted(self._stats.items())}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+executor = HashingExecutor()
+
+
+def release_pooled_connections():
+    """
+    Give this thread's pooled database connections back while it queues and hashes, so waiting
+    logins do not starve other requests of connections; the next query takes one again.
+    """
+    for connection in connections.all(initialized_only=True):
+        if getattr(connection, 'pool', None) is not None and not connection.in_atomic_block:
+            connection.close()
+
+
+class BoundedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2PasswordHasher (same algorithm name and format) running its hashes on `executor`."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+    def encode(self, password, salt, iterations=None):
+        return executor.run('hash', super().encode, password, salt, iterations)
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        encoded_2 = executor.run('verify', super().encode, password, decoded['salt'], decoded['iterations'])
+        return constant_time_compare(encoded, encoded_2)
+
+    def harden_runtime(self, password, encoded):
+        # wrong password against an older, cheaper hash: spend the difference, as Django does
+        decoded = self.decode(encoded)
+        extra_iterations = self.iterations - decoded['iterations']
+        if extra_iterations > 0:
+            executor.run('harden', super().encode, password, decoded['salt'], extra_iterations)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def password_hashing_stats(request):
+    """Password hashing counters since start-up (or the last DELETE), per operation."""
+    if request.method == 'DELETE':
+        executor.reset()
+        return Response(status=204)
+    return Response(executor.snapshot())
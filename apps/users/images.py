@@ -0,0 +1,147 @@
+"""
+Profile photo renditions.
+
+`add_photo` stores the upload and schedules `process_photo` on a small
+thread pool once the transaction commits. The worker decodes the original
+once (JPEG draft mode decodes straight at the largest needed scale), then
+writes a square WebP and JPEG per size in PHOTO_RENDITION_SIZES. Only pixels
+are copied, so EXIF (GPS, camera) and other metadata never reach the
+renditions. Each file is written to a temporary name and renamed into place.
+
+Rendition names derive from the original's name, so their URLs are known as
+soon as the upload is saved and change with every new photo.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from .authentication import user_row_cache
+from .models import NewUser
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def rendition_sizes():
+    return tuple(sorted(getattr(settings, 'PHOTO_RENDITION_SIZES', (64, 128, 256, 512))))
+
+
+def rendition_names(photo_name):
+    """{size: {format: storage name}} for the original stored as `photo_name`."""
+    digest = hashlib.sha1(photo_name.encode()).hexdigest()[:12]
+    base = f'users/renditions/{digest}'
+    return {str(size): {ext: f'{base}-{size}.{ext}' for ext in FORMATS} for size in rendition_sizes()}
+
+
+def delete_renditions(renditions):
+    for names in (renditions or {}).values():
+        for name in names.values():
+            default_storage.delete(name)
+
+
+def validate_photo(upload):
+    """Cheap header-only check on the request thread; raises ValueError for non-images."""
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError) as ex:
+        raise ValueError(str(ex))
+    finally:
+        upload.seek(0)
+    if width * height > getattr(settings, 'PHOTO_MAX_PIXELS', 40_000_000):
+        raise ValueError('image is too large')
+
+
+def write_atomic(name, data):
+    if hasattr(default_storage, 'path'):
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    else:
+        # object stores make the upload visible only once complete
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(data))
+
+
+def render(photo_name, renditions):
+    largest = max(rendition_sizes())
+    with default_storage.open(photo_name, 'rb') as f, Image.open(f) as original:
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    for size, names in sorted(renditions.items(), key=lambda item: -int(item[0])):
+        # each size is resampled from the previous, larger one
+        image = ImageOps.fit(image, (int(size), int(size)), Image.Resampling.LANCZOS)
+        for ext, name in names.items():
+            image_format, options = FORMATS[ext]
+            frame = image.convert('RGB') if image_format == 'JPEG' else image
+            buffer = BytesIO()
+            frame.save(buffer, image_format, **options)
+            write_atomic(name, buffer.getvalue())
+
+
+def process_photo(user_pk, photo_name):
+    renditions = rendition_names(photo_name)
+    try:
+        render(photo_name, renditions)
+        photo_status = 'ready'
+    except Exception:
+        logger.exception('Could not process photo %s of user %s', photo_name, user_pk)
+        photo_status = 'failed'
+    # a newer upload may have replaced this one meanwhile
+    updated = NewUser.objects.filter(pk=user_pk, photo=photo_name).update(photo_status=photo_status)
+    user_row_cache.invalidate(user_pk)
+    if not updated:
+        delete_renditions(renditions)
+
+
+def run_in_worker(task):
+    try:
+        task()
+    finally:
+        # worker threads open their own connections
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    workers = getattr(settings, 'PHOTO_WORKERS', 2)
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='photo')
+        return _executor
+
+
+def schedule_photo_processing(user):
+    """Render `user.photo` once the current transaction commits."""
+    task = partial(process_photo, user.pk, user.photo.name)
+    executor = get_executor()
+    if executor is None:
+        transaction.on_commit(task)
+    else:
+        transaction.on_commit(partial(executor.submit, run_in_worker, task))
@@ -0,0 +1,34 @@
+import statistics
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Time PBKDF2 on this machine and suggest PASSWORD_HASH_ITERATIONS for a target time "
+        "per hash. Passwords stored with another count are re-hashed on their next login."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250.0, help="Wanted time per hash.")
+        parser.add_argument('--samples', type=int, default=5)
+
+    def handle(self, *args, target_ms, samples, **options):
+        current = settings.PASSWORD_HASH_ITERATIONS
+        # the plain hasher: the timing is of PBKDF2 itself, not of the queue in front of it
+        hasher = PBKDF2PasswordHasher()
+        salt = hasher.salt()
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            hasher.encode('tune-password-hasher', salt, current)
+            timings.append((time.perf_counter() - start) * 1000)
+        measured = statistics.median(timings)
+        # round to 10k so repeated runs do not re-hash everyone over noise
+        suggested = max(10000, int(round(current * target_ms / measured, -4)))
+        self.stdout.write(f"{current} iterations: {measured:.1f}ms per hash (median of {samples})")
+        self.stdout.write(f"{suggested} iterations for about {target_ms:.0f}ms, "
+                          f"{settings.PASSWORD_HASHING_CONCURRENCY} at a time per process")
+        self.stdout.write(self.style.SUCCESS(f"PASSWORD_HASH_ITERATIONS={suggested}"))
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:06
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0003_newuser_last_name"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="newuser",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["username"],
+                name="users_username_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newuser",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["first_name"],
+                name="users_first_name_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newuser",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("username"),
+                    name="text_pattern_ops",
+                ),
+                name="users_username_prefix",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newuser",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("first_name"),
+                    name="text_pattern_ops",
+                ),
+                name="users_first_name_prefix",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0004_newuser_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenClaimsUser",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("users.newuser",),
+        ),
+    ]
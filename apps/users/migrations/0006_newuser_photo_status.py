@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0005_tokenclaimsuser"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newuser",
+            name="photo_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "Pending"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
@@ -40,6 +42,9 @@ class NewUser(AbstractBaseUser, PermissionsMixin):
     joined_at = models.DateTimeField(default=timezone.now)
     about = models.TextField(_('about'), max_length=500, blank=True, null=True)
     photo = models.ImageField(null=True, blank=True, upload_to='users/')
+    # renditions of `photo`, see users.images
+    photo_status = models.CharField(max_length=10, blank=True, default='', choices=[
+        ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')])
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
 
@@ -47,5 +52,54 @@ class NewUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email', 'first_name']
 
+    class Meta:
+        indexes = [
+            # fuzzy author search (pg_trgm similarity operators)
+            GinIndex(fields=['username'], name='users_username_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['first_name'], name='users_first_name_trgm', opclasses=['gin_trgm_ops']),
+            # typeahead prefix path, matches the UPPER(...) LIKE 'q%' of istartswith
+            models.Index(OpClass(Upper('username'), name='text_pattern_ops'), name='users_username_prefix'),
+            models.Index(OpClass(Upper('first_name'), name='text_pattern_ops'), name='users_first_name_prefix'),
+        ]
+
     def __str__(self):
         return self.username
+
+
+class TokenClaimsUser(NewUser):
+    """
+    NewUser built from access token claims without a database hit.
+
+    Only the claim fields are loaded; touching any other field loads the
+    full row once, through the short-TTL cache in users.authentication.
+    Being a proxy of NewUser it can be assigned to foreign keys and compares
+    equal to the NewUser with the same pk.
+    """
+    CLAIM_FIELDS = ('id', 'is_staff', 'is_active')
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, claims):
+        values = {name: claims[name] for name in cls.CLAIM_FIELDS}
+        names = [f.attname for f in cls._meta.concrete_fields if f.attname in values]
+        return cls.from_db(None, names, [values[name] for name in names])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is None or not deferred.intersection(fields):
+            return super().refresh_from_db(using, fields, from_queryset)
+        from .authentication import user_row_cache
+        row = user_row_cache.get(self.pk)
+        for name in deferred:
+            setattr(self, name, getattr(row, name))
+
+    def save(self, *args, **kwargs):
+        # claims can be stale, never write them back
+        if kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.attname for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in deferred and f.attname not in self.CLAIM_FIELDS]
+        return super().save(*args, **kwargs)
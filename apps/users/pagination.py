@@ -1,7 +1,36 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 
 class AuthorsPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+class AuthorsCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the unique username, for alphabetical listings. No COUNT(*)
+    and no OFFSET scan, so the Nth page costs the same as the first one.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('username',)
+
+
+class AuthorsSimilarityCursorPagination(AuthorsCursorPagination):
+    """
+    Keyset pagination over the `similarity` annotation of fuzzy search. The cursor carries
+    the last similarity; authors sharing it are skipped by offset, in username order.
+    """
+    ordering = ('-similarity', 'username')
+
+
+def get_authors_paginator(request, default=AuthorsPagination, cursor=AuthorsCursorPagination):
+    """
+    Cursor mode is opt-in with `?pagination=cursor`. Pass the cursor class keyed on the
+    queryset's order, or cursor=None to stay on `default`.
+    """
+    if cursor and request.query_params.get('pagination') == 'cursor':
+        return cursor()
+    return default() if default else None
@@ -1,8 +1,41 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from .models import NewUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from blog_api.sparse_fields import SparseFieldsMixin
+from .authentication import user_claims
+from .images import rendition_names
+from .models import NewUser, TokenClaimsUser
+from .tokens import RefreshToken
 
 
-class UserSerializer(serializers.ModelSerializer):
+class PhotoRenditionsField(serializers.Field):
+    """{size: {format: url}} for the renditions of the photo, see users.images."""
+
+    def __init__(self, **kwargs):
+        super().__init__(source='photo', read_only=True, **kwargs)
+
+    def to_representation(self, photo):
+        if not photo:
+            return {}
+        request = self.context.get('request')
+        renditions = {}
+        for size, names in rendition_names(photo.name).items():
+            renditions[size] = {}
+            for ext, name in names.items():
+                url = photo.storage.url(name)
+                renditions[size][ext] = request.build_absolute_uri(url) if request else url
+        return renditions
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    photo_renditions = PhotoRenditionsField()
+    # blog.stats over the user's published posts
+    post_count = serializers.IntegerField(source='stats.post_count', read_only=True)
+    comment_count = serializers.IntegerField(source='stats.comment_count', read_only=True)
+    latest_post_at = serializers.DateTimeField(source='stats.latest_post_at', read_only=True)
+
     class Meta:
         model = NewUser
         fields = [
@@ -13,10 +46,18 @@ class UserSerializer(serializers.ModelSerializer):
             'username',
             'password',
             'photo',
+            'photo_status',
+            'photo_renditions',
             'about',
             'joined_at',
-            'is_active']
+            'is_active',
+            'post_count',
+            'comment_count',
+            'latest_post_at']
+        read_only_fields = ['photo_status']
+        select_fields = {name: 'stats' for name in ('post_count', 'comment_count', 'latest_post_at')}
         extra_kwargs = {'password': {'write_only': True}}
+        required_columns = ['username']  # cursor pagination key
 
     def create(self, validated_data):
         password = validated_data.pop('password')
@@ -25,3 +66,33 @@ class UserSerializer(serializers.ModelSerializer):
             instance.set_password(password)
         instance.save()
         return instance
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Stamps the claims read by ClaimsJWTAuthentication into the token pair."""
+
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Re-reads the claims on refresh so staff/active changes reach new access tokens."""
+
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = NewUser.objects.filter(
+            pk=refresh[api_settings.USER_ID_CLAIM]).only(*TokenClaimsUser.CLAIM_FIELDS).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(
+                _("No active account found for the given token."), code="no_active_account")
+        for claim, value in user_claims(user).items():
+            refresh[claim] = value
+        return super().validate({'refresh': str(refresh)})
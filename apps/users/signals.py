@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import user_row_cache
+from .models import NewUser, TokenClaimsUser
+
+
+@receiver([post_save, post_delete], sender=NewUser)
+@receiver([post_save, post_delete], sender=TokenClaimsUser)
+def invalidate_user_row(sender, instance, **kwargs):
+    user_row_cache.invalidate(instance.pk)
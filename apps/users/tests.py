@@ -0,0 +1,390 @@
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from blog.models import Category, Post
+from .authentication import ClaimsJWTAuthentication, user_row_cache
+from .hashing import executor
+from .models import NewUser
+from .images import rendition_names
+from .tokens import LOG_KEY, BloomFilter, RefreshToken, RevocationFilter, revocations
+
+
+class SearchForAuthorsTests(APITestCase):
+    def setUp(self):
+        self.reader = NewUser.objects.create_user(
+            'reader@example.com', 'reader', 'Reader', 'password123')
+        NewUser.objects.create_user('jon@example.com', 'jonathan', 'Jonathan', 'password123')
+        NewUser.objects.create_user('jo@example.com', 'jolene', 'Jolene', 'password123')
+        NewUser.objects.create_user('mar@example.com', 'marguerite', 'Margo', 'password123')
+        self.client.force_authenticate(self.reader)
+
+    def search(self, query, **params):
+        return self.client.get(reverse('users:authors_search', args=[query]), params)
+
+    def usernames(self, response):
+        return [author['username'] for author in response.data['results']]
+
+    def test_fuzzy_search_tolerates_typos(self):
+        response = self.search('jonathn')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.usernames(response), ['jonathan'])
+
+    def test_short_query_takes_prefix_path(self):
+        response = self.search('jo')
+        self.assertEqual(self.usernames(response), ['jolene', 'jonathan'])
+
+    def test_explicit_prefix_match(self):
+        response = self.search('MAR', match='prefix')
+        self.assertEqual(self.usernames(response), ['marguerite'])
+
+    def test_no_match_returns_404_without_extra_query(self):
+        # the page query doubles as the empty check, cursor mode skips COUNT(*)
+        with self.assertNumQueries(1):
+            response = self.search('zzzzzz', match='prefix', pagination='cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_mode_keeps_match_order(self):
+        NewUser.objects.create_user('jonny@example.com', 'jonny', 'Jon', 'password123')
+        response = self.search('jonathan', pagination='cursor', page_size=1)
+        self.assertEqual(self.usernames(response), ['jonathan'])
+        ranked = self.usernames(self.search('jonathan'))
+        paged = []
+        while response.data['results']:
+            paged += self.usernames(response)
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(paged, ranked)
+        response = self.search('jo', pagination='cursor', page_size=2)
+        self.assertEqual(self.usernames(response), ['jolene', 'jonathan'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.usernames(response), ['jonny'])
+
+
+class UserSparseFieldsTests(APITestCase):
+    def test_fields_limits_user_payload(self):
+        user = NewUser.objects.create_user('me@example.com', 'me', 'Me', 'password123')
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            reverse('users:user-detail', args=[user.pk]), {'fields': 'id,username'})
+        self.assertEqual(response.data, {'id': user.pk, 'username': 'me'})
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_row_cache.clear()
+        self.user = NewUser.objects.create_user('me@example.com', 'me', 'Me', 'password123')
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'me', 'password': 'password123'})
+        self.tokens = response.data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def test_claims_user_needs_no_query(self):
+        request = self.client.get('/').wsgi_request
+        # no query until a non-claim field is touched
+        with self.assertNumQueries(0):
+            user, _ = ClaimsJWTAuthentication().authenticate(Request(request))
+            self.assertEqual((user.pk, user.is_staff, user.is_active), (self.user.pk, False, True))
+            self.assertEqual(user, self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual((user.username, user.email), ('me', 'me@example.com'))
+        # later lazy users are served from the row cache
+        other, _ = ClaimsJWTAuthentication().authenticate(Request(request))
+        with self.assertNumQueries(0):
+            self.assertEqual(other.first_name, 'Me')
+
+    def test_claims_user_can_change_password(self):
+        response = self.client.post(
+            reverse('users:chango_password', args=[self.user.pk]),
+            {'old_password': 'password123', 'new_password': 'password456',
+             'confirm_password': 'password456'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('password456'))
+
+    def test_refresh_restamps_claims(self):
+        NewUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.tokens['refresh']})
+        self.assertTrue(AccessToken(response.data['access'])['is_staff'])
+
+        NewUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(reverse('token_refresh'), {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_tokens_without_claims_fall_back_to_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        response = self.client.get(reverse('users:user-detail', args=[self.user.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+class DeletedUserTokenTests(APITransactionTestCase):
+    # foreign keys are checked at commit, which a TestCase never reaches
+    def test_writes_with_a_deleted_users_token_are_unauthorized(self):
+        user = NewUser.objects.create_user('me@example.com', 'me', 'Me', 'password123')
+        author = NewUser.objects.create_user('author@example.com', 'author', 'Author', 'password123')
+        category = Category.objects.create(name='general')
+        post = Post.objects.create(title='theirs', slug='theirs', content='x', category=category, author=author)
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'me', 'password': 'password123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        user.delete()
+
+        response = self.client.post(reverse('blog_api:post-list'), {
+            'title': 'orphan', 'content': 'x', 'category': category.pk})
+        self.assertEqual((response.status_code, response.data['detail'].code), (401, 'user_not_found'))
+        response = self.client.post(reverse('blog_api:comment-list', args=[post.pk]), {'comment': 'orphan'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Post.objects.get(pk=post.pk).comment_count, 0)
+
+
+class RefreshTokenBlacklistTests(APITestCase):
+    def setUp(self):
+        revocations.reset()
+        NewUser.objects.create_user('me@example.com', 'me', 'Me', 'password123')
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'me', 'password': 'password123'})
+        self.refresh = response.data['refresh']
+
+    def refresh_token(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': token})
+
+    def test_rotated_token_is_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.refresh_token(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        # revoked a moment ago, so the recent LRU answers without a query
+        with self.assertNumQueries(0):
+            response = self.refresh_token(self.refresh)
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_blacklists_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('users:blacklist'), {'refresh_token': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+
+    def test_revocation_by_another_process_applies_at_once(self):
+        # rotation blacklists the token, but without the commit hook this process's filter is not
+        # told, as for a revocation in another worker; a per-process cache cannot tell it either
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 200)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+
+    def use_shared_cache(self):
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.gettempdir() + '/blacklist-tests'}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        # another process revoked a token before this one built its filter
+        RevocationFilter().add('revoked-before')
+        revocations.status('never-issued')
+
+    def test_shared_cache_uses_the_filter(self):
+        self.use_shared_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(revocations.status('never-issued'), revocations.CLEAN)
+
+    def test_revocations_from_other_processes_arrive_through_the_cache(self):
+        self.use_shared_cache()
+        RevocationFilter().add('revoked-elsewhere')
+        with self.assertNumQueries(0):
+            self.assertEqual(revocations.status('revoked-elsewhere'), revocations.REVOKED)
+            self.assertEqual(revocations.status('never-issued'), revocations.CLEAN)
+
+    def test_missing_log_entries_sync_past_the_last_id(self):
+        self.use_shared_cache()
+        # blacklisted in the table, the log moves on without its entry (expired, evicted)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 200)
+        caches['default'].incr(LOG_KEY)
+        jti = RefreshToken(self.refresh, verify=False)['jti']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(revocations.status(jti), revocations.REVOKED)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"token_blacklist_blacklistedtoken"."id" >', queries[0]['sql'])
+
+    def test_revocations_survive_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('users:blacklist'), {'refresh_token': self.refresh})
+        revocations.reset()
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        keys = [f'jti-{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class PhotoRenditionTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, PHOTO_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = NewUser.objects.create_user('me@example.com', 'me', 'Me', 'password123')
+        self.client.force_authenticate(self.user)
+
+    def upload(self, size=(1200, 800)):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+        photo = SimpleUploadedFile('me.jpg', buffer.getvalue(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('users:user-add-photo', args=[self.user.pk]), {'photo': photo}, format='multipart')
+
+    def test_upload_produces_stripped_renditions(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(set(response.data['photo_renditions']), {'64', '128', '256', '512'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_status, 'ready')
+
+        names = rendition_names(self.user.photo.name)
+        with default_storage.open(names['128']['jpeg']) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (128, 128))
+            self.assertFalse(image.getexif())
+        with default_storage.open(names['512']['webp']) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (512, 512)))
+
+    def test_rejects_non_images(self):
+        photo = SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post(
+            reverse('users:user-add-photo', args=[self.user.pk]), {'photo': photo}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_delete_photo_removes_renditions(self):
+        self.upload()
+        self.user.refresh_from_db()
+        names = rendition_names(self.user.photo.name)
+        self.client.delete(reverse('users:user-delete-photo', args=[self.user.pk]))
+        self.assertFalse(default_storage.exists(names['64']['webp']))
+
+
+@override_settings(THROTTLE_RATES={'search': '2/min', 'login': '2/min', 'signup': '1/hour'},
+                   PASSWORD_HASH_ITERATIONS=1000)
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.reader = NewUser.objects.create_user('reader@example.com', 'reader', 'Reader', 'password123')
+        self.writer = NewUser.objects.create_user('writer@example.com', 'writer', 'Writer', 'password123')
+
+    def login(self, **extra):
+        return self.client.post(reverse('token_obtain_pair'), {'username': 'nobody', 'password': 'x'}, **extra)
+
+    def test_rejected_before_authentication_with_retry_after(self):
+        # a frozen clock, so no tokens refill while the 401s run their dummy password hash
+        with mock.patch('blogapp.throttling.time.time', return_value=time.time()):
+            self.assertEqual([self.login().status_code for _ in range(2)], [401, 401])
+            with self.assertNumQueries(0):
+                response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertIn('Expected available in 30 seconds', response.json()['detail'])
+        # other addresses have their own bucket
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.2').status_code, 401)
+
+    def test_forwarded_for_ignored_without_trusted_proxies(self):
+        statuses = [self.login(HTTP_X_FORWARDED_FOR=f'10.0.1.{n}').status_code for n in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+
+    def test_forwarded_for_from_trusted_proxy(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            # the proxy appends the address it saw, whatever the client sent before it
+            statuses = [self.login(HTTP_X_FORWARDED_FOR=f'10.0.1.{n}, 198.51.100.7').status_code for n in range(3)]
+            self.assertEqual(statuses, [401, 401, 429])
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR='198.51.100.8').status_code, 401)
+
+    def test_buckets_refill(self):
+        self.login()
+        self.login()
+        self.assertEqual(self.login().status_code, 429)
+        with mock.patch('blogapp.throttling.time.time', return_value=time.time() + 31):
+            self.assertEqual(self.login().status_code, 401)
+
+    def test_per_user_buckets(self):
+        url = reverse('users:authors_search', args=['wri'])
+        for user in (self.reader, self.writer):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+            self.assertEqual([self.client.get(url).status_code for _ in range(3)], [200, 200, 429])
+
+    def test_only_listed_methods(self):
+        url = reverse('users:user-list')
+        data = {'email': 'new@example.com', 'username': 'new', 'first_name': 'New', 'password': 'password123'}
+        self.assertEqual(self.client.post(url, data).status_code, 201)
+        other = {**data, 'email': 'other@example.com', 'username': 'other'}
+        self.assertEqual(self.client.post(url, other).status_code, 429)
+        self.client.force_authenticate(self.reader)
+        self.assertNotEqual(self.client.get(url).status_code, 429)
+
+    async def test_async_requests(self):
+        client = AsyncClient()
+        url = reverse('token_obtain_pair')
+        statuses = [(await client.post(url, {'username': 'nobody', 'password': 'x'})).status_code
+                    for _ in range(3)]
+        self.assertEqual(statuses[2], 429)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        executor.reset()
+        self.user = NewUser.objects.create_user('reader@example.com', 'reader', 'Reader', 'password123')
+
+    def login(self, password='password123'):
+        return self.client.post(reverse('token_obtain_pair'), {'username': 'reader', 'password': password})
+
+    def test_rehashed_to_new_work_factor_on_login(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login('wrong').status_code, 401)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password('password123'))
+        self.assertEqual(set(executor.snapshot()), {'hash', 'verify', 'harden'})
+
+    @override_settings(PASSWORD_HASHING_QUEUE_TIMEOUT=0.01)
+    def test_busy_executor_answers_503(self):
+        _, slots = executor._ensure_pool()
+        held = 0
+        while slots.acquire(blocking=False):
+            held += 1
+        try:
+            response = self.login()
+        finally:
+            for _ in range(held):
+                slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(executor.snapshot()['verify']['rejected'], 1)
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_stats_for_staff(self):
+        url = reverse('password_hashing_stats')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(NewUser.objects.create_superuser('a@example.com', 'admin', 'Admin', 'pw'))
+        self.assertEqual(self.client.get(url).json()['hash']['count'], 2)
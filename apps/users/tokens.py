@@ -0,0 +1,221 @@
+"""
+Refresh tokens with an in-process blacklist filter.
+
+simplejwt checks the BlacklistedToken table on every refresh. Here each
+process keeps a Bloom filter of every revoked, unexpired JTI and an LRU of
+recently revoked ones:
+
+* not in the filter: the token is clean, no query;
+* in the LRU: the token is revoked, no query;
+* otherwise (a Bloom false positive or an older revocation): ask the table.
+
+The filter is built from the table on first use and rebuilt every
+BLACKLIST_REBUILD_INTERVAL seconds. A revoke publishes its JTI in the shared
+cache, as the next entry of a numbered log, and every check reads the log's
+head: new entries are added to the filter without a query. A process that
+falls behind the log (evicted or expired entries), and every process once
+per BLACKLIST_SYNC_INTERVAL, reads the rows past the highest BlacklistedToken
+id it has seen instead, a primary key range scan.
+
+Expired tokens are not purged here; run `manage.py flushexpiredtokens`
+periodically.
+
+The log only reaches other processes through a shared cache. With a
+per-process one (locmem, the default without REDIS_URL) a token revoked
+elsewhere would pass until the next poll, so there is no filter: the LRU
+answers for this process's own revocations and everything else asks the table.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+# number of the latest published revocation, entries live under LOG_KEY:<number>
+LOG_KEY = 'users:token_blacklist:log'
+# a process further behind the log reads the table instead
+LOG_MAX_ENTRIES = 1000
+# rows committed out of id order still get picked up by the table sync
+SYNC_OVERLAP = 100
+# caches other processes cannot see
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def _log_entry_key(number):
+    return f'{LOG_KEY}:{number}'
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationFilter:
+    REVOKED, CLEAN, UNKNOWN = 'revoked', 'clean', 'unknown'
+
+    def __init__(self):
+        self.error_rate = getattr(settings, 'BLACKLIST_FILTER_ERROR_RATE', 0.01)
+        self.recent_size = getattr(settings, 'BLACKLIST_RECENT_SIZE', 10000)
+        self.sync_interval = getattr(settings, 'BLACKLIST_SYNC_INTERVAL', 5)
+        self.rebuild_interval = getattr(settings, 'BLACKLIST_REBUILD_INTERVAL', 3600)
+        # long enough for processes checking tokens to read an entry before their next table sync
+        self.log_timeout = max(60, 10 * self.sync_interval)
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._recent = OrderedDict()
+        self._head = None
+        self._last_id = 0
+        self._next_sync = 0
+        self._next_rebuild = 0
+
+    def status(self, jti):
+        if isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES):
+            with self._lock:
+                return self.REVOKED if jti in self._recent else self.UNKNOWN
+        self._refresh()
+        with self._lock:
+            if jti in self._recent:
+                return self.REVOKED
+            if jti not in self._bloom:
+                return self.CLEAN
+        return self.UNKNOWN
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._add(jti)
+            else:
+                self._remember(jti)
+        try:
+            number = cache.incr(LOG_KEY)
+        except ValueError:
+            # no log yet, or evicted: start from the clock, readers see the jump and sync from the table
+            cache.add(LOG_KEY, time.time_ns(), None)
+            number = cache.incr(LOG_KEY)
+        cache.set(_log_entry_key(number), jti, self.log_timeout)
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._recent.clear()
+            self._next_rebuild = 0
+
+    def _add(self, jti):
+        if jti in self._bloom:
+            self._remember(jti)
+            return
+        if self._bloom.count >= self._bloom.capacity:
+            # full, the next status() call rebuilds at double the size
+            self._next_rebuild = 0
+        self._bloom.add(jti)
+        self._remember(jti)
+
+    def _remember(self, jti):
+        self._recent[jti] = None
+        self._recent.move_to_end(jti)
+        while len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now >= self._next_rebuild:
+            self._rebuild(now)
+            return
+        head = cache.get(LOG_KEY)
+        if now >= self._next_sync:
+            self._sync(now, head)
+        elif head != self._head:
+            self._read_log(now, head)
+
+    def _read_log(self, now, head):
+        behind = head - self._head if head is not None and self._head is not None else 0
+        if not 0 < behind <= LOG_MAX_ENTRIES:
+            self._sync(now, head)
+            return
+        keys = [_log_entry_key(number) for number in range(self._head + 1, head + 1)]
+        jtis = cache.get_many(keys)
+        if len(jtis) < len(keys):
+            # expired or evicted, or published a moment ago and not written yet
+            self._sync(now, head)
+            return
+        with self._lock:
+            for jti in jtis.values():
+                self._add(jti)
+            self._head = head
+
+    def _rebuild(self, now):
+        head = cache.get(LOG_KEY)
+        last_id = BlacklistedToken.objects.aggregate(last=Max('id'))['last'] or 0
+        jtis = list(BlacklistedToken.objects.filter(
+            token__expires_at__gt=timezone.now()).values_list('token__jti', flat=True))
+        bloom = BloomFilter(max(2 * len(jtis), 1024), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            self._bloom = bloom
+            self._recent.clear()
+            self._head = head
+            self._last_id = last_id
+            self._next_sync = now + self.sync_interval
+            self._next_rebuild = now + self.rebuild_interval
+
+    def _sync(self, now, head):
+        rows = list(BlacklistedToken.objects.filter(
+            id__gt=self._last_id - SYNC_OVERLAP).values_list('id', 'token__jti'))
+        with self._lock:
+            for pk, jti in rows:
+                self._add(jti)
+                self._last_id = max(self._last_id, pk)
+            self._head = head
+            self._next_sync = now + self.sync_interval
+
+
+revocations = RevocationFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+    """Refresh token whose blacklist check goes through `revocations` first."""
+
+    def check_blacklist(self):
+        status = revocations.status(self.payload[api_settings.JTI_CLAIM])
+        if status == RevocationFilter.REVOKED:
+            raise TokenError(_("Token is blacklisted"))
+        if status == RevocationFilter.UNKNOWN:
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        transaction.on_commit(partial(revocations.add, self.payload[api_settings.JTI_CLAIM]))
+        return result
@@ -5,9 +5,13 @@ from rest_framework.views import APIView
 from rest_framework import status, viewsets
 from rest_framework.permissions import AllowAny, IsAdminUser, \
     IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
-from .pagination import AuthorsPagination
-from django.db.models import Q
+from rest_framework_simplejwt.exceptions import TokenError
+from .pagination import AuthorsCursorPagination, AuthorsSimilarityCursorPagination, get_authors_paginator
+from .tokens import RefreshToken
+from .images import delete_renditions, rendition_names, schedule_photo_processing, validate_photo
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Greatest
+from django.contrib.postgres.search import TrigramWordSimilarity
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.shortcuts import get_object_or_404
@@ -17,11 +21,17 @@ from drf_yasg import openapi
 from .custom_permissions import UserAuthentication
 # Create your views here.
 
+# shorter queries have no complete trigram to match on
+MIN_TRIGRAM_QUERY_LENGTH = 3
+
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = NewUser.objects.all()
     serializer_class = UserSerializer
 
+    def get_queryset(self):
+        return UserSerializer.sparse_queryset(super().get_queryset(), self.request)
+
     def get_permissions(self):
         if self.action == 'create':
             return [AllowAny()]
@@ -115,8 +125,10 @@ class UserViewSet(viewsets.ModelViewSet):
     def delete_photo(self, request, pk):
         user = self.get_object()
         if user.photo:
-            user.photo.delete()
+            delete_renditions(rendition_names(user.photo.name))
+            user.photo.delete(save=False)
             user.photo = None
+            user.photo_status = ''
             user.save()
         return Response({'message': 'photo deleted successfully'},
                         status=status.HTTP_204_NO_CONTENT)
@@ -133,8 +145,8 @@ class UserViewSet(viewsets.ModelViewSet):
             },
         ),
         responses={
-            status.HTTP_200_OK:
-            openapi.Response(description="Photo added successfully"),
+            status.HTTP_202_ACCEPTED:
+            openapi.Response(description="Photo stored, renditions are being processed"),
             status.HTTP_400_BAD_REQUEST:
             openapi.Response(description="No photo provided or invalid data")
         }
@@ -145,12 +157,24 @@ class UserViewSet(viewsets.ModelViewSet):
         if not photo:
             return Response({'message': 'no photo added'},
                             status=status.HTTP_400_BAD_REQUEST)
+        try:
+            validate_photo(photo)
+        except ValueError as ex:
+            return Response({'message': f'invalid photo: {ex}'},
+                            status=status.HTTP_400_BAD_REQUEST)
         if user.photo:
-            user.photo.delete()
+            delete_renditions(rendition_names(user.photo.name))
+            user.photo.delete(save=False)
         user.photo = photo
+        user.photo_status = 'pending'
         user.save()
-        return Response({'message': 'photo added successfully'},
-                        status=status.HTTP_200_OK)
+        schedule_photo_processing(user)
+        serializer = UserSerializer(user, context={'request': request})
+        return Response({'message': 'photo added successfully',
+                         'photo': serializer.data['photo'],
+                         'photo_status': user.photo_status,
+                         'photo_renditions': serializer.data['photo_renditions']},
+                        status=status.HTTP_202_ACCEPTED)
 
 
 class BlackListTokenView(APIView):
@@ -177,12 +201,13 @@ class BlackListTokenView(APIView):
     )
     def post(self, request):
         try:
-            refresh_token = request.data['refresh_token']
-            token = RefreshToken(refresh_token)
+            token = RefreshToken(request.data['refresh_token'])
             token.blacklist()
-        except Exception as ex:
+        except (KeyError, TokenError) as ex:
             return Response({'error': f'{str(ex)}'},
                             status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': 'token blacklisted successfully'},
+                        status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -192,7 +217,9 @@ class BlackListTokenView(APIView):
     operation_summary="Search for Authors",
     operation_description=(
         "This endpoint allows authenticated users to search for authors "
-        "based on their first name or username."
+        "based on their first name or username. Matching is fuzzy (trigram "
+        "word similarity) and ranked; queries shorter than three characters, "
+        "or `match=prefix`, take the typeahead prefix path."
     ),
     manual_parameters=[
         openapi.Parameter(
@@ -203,6 +230,22 @@ class BlackListTokenView(APIView):
             type=openapi.TYPE_STRING,
             required=True,
         ),
+        openapi.Parameter(
+            'match',
+            openapi.IN_QUERY,
+            description="Set to `prefix` for typeahead matching on the start of the name.",
+            type=openapi.TYPE_STRING,
+            enum=['prefix'],
+        ),
+        openapi.Parameter(
+            'pagination',
+            openapi.IN_QUERY,
+            description=(
+                "Set to `cursor` for keyset pagination: on username for prefix matches, "
+                "on similarity for fuzzy matches."),
+            type=openapi.TYPE_STRING,
+            enum=['cursor'],
+        ),
     ],
     responses={
         200: openapi.Response(
@@ -223,24 +266,40 @@ class BlackListTokenView(APIView):
         ),
     },
 )
-def search_for_authors(request):
-    search_query = request.query_params.get('search_query', '').strip()
+def search_for_authors(request, search_query=None):
+    search_query = (search_query or request.query_params.get('search_query', '')).strip()
     if not search_query:
         return Response({'error': 'search_query parameter is required'},
                         status=status.HTTP_400_BAD_REQUEST)
 
-    authors = NewUser.objects.filter(
-        Q(first_name__icontains=search_query) |
-        Q(username__icontains=search_query)
-    )
-    paginator = AuthorsPagination()
+    if request.query_params.get('match') == 'prefix' or len(search_query) < MIN_TRIGRAM_QUERY_LENGTH:
+        # typeahead: served by the UPPER(...) text_pattern_ops indexes
+        authors = NewUser.objects.filter(
+            Q(username__istartswith=search_query) |
+            Q(first_name__istartswith=search_query)
+        ).order_by('username')
+        cursor = AuthorsCursorPagination
+    else:
+        # fuzzy: served by the gin_trgm_ops indexes
+        authors = NewUser.objects.filter(
+            Q(username__trigram_word_similar=search_query) |
+            Q(first_name__trigram_word_similar=search_query)
+        ).annotate(
+            # a real, read back rounded; as a double the cursor's position matches the row exactly
+            similarity=Cast(Greatest(
+                TrigramWordSimilarity(search_query, 'username'),
+                TrigramWordSimilarity(search_query, 'first_name')), FloatField())
+        ).order_by('-similarity', 'username')
+        cursor = AuthorsSimilarityCursorPagination
+    authors = UserSerializer.sparse_queryset(authors, request)
+    paginator = get_authors_paginator(request, cursor=cursor)
     paginated_authors = paginator.paginate_queryset(authors, request)
-    if not authors.exists():
+    if not paginated_authors:
         return Response({'message': 'No similar authors found'},
                         status=status.HTTP_404_NOT_FOUND)
 
-    serializer = UserSerializer(paginated_authors, many=True)
-    return paginator.get_paginated_response(serializer.data, status=status.HTTP_200_OK)
+    serializer = UserSerializer(paginated_authors, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
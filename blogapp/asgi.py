@@ -2,6 +2,7 @@
 ASGI config for blogapp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``uvicorn blogapp.asgi:application`` (see docker-compose.yml).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -10,7 +11,11 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from .fileserver import ASGIFiles
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogapp.settings")
+# coroutine views for the hot read endpoints, see blog_api/async_views.py
+os.environ.setdefault("ASYNC_READ_VIEWS", "True")
 
-application = get_asgi_application()
+# static and media files are answered before Django, see blogapp/fileserver.py
+application = ASGIFiles(get_asgi_application())
@@ -0,0 +1,32 @@
+"""
+Content codings of precompressed responses (the OpenAPI spec, static files).
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+# preferred first; mtime=0 keeps the gzip bytes a function of the content
+ENCODINGS = {'gzip': ('.gz', lambda data: gzip.compress(data, mtime=0))}
+if brotli is not None:
+    ENCODINGS = {'br': ('.br', brotli.compress), **ENCODINGS}
+
+
+def accepted_encoding(accept_encoding, available):
+    """The first of `available` (in ENCODINGS order) allowed by the `accept_encoding` header, or None."""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    for name in ENCODINGS:
+        if name in available and (name in accepted or '*' in accepted):
+            return name
+    return None
@@ -0,0 +1,284 @@
+"""
+Static and media files served in front of Django.
+
+blogapp/wsgi.py and blogapp/asgi.py wrap the Django application so that
+requests under STATIC_URL (from STATIC_ROOT) and MEDIA_URL (from MEDIA_ROOT)
+never reach the URL resolver or the middleware: no session, authentication,
+routing or stats work for an avatar. Responses support conditional requests
+(ETag, Last-Modified) and single byte `Range` requests. The body is handed
+over as a file: gunicorn sends it with sendfile(2), and uvicorn and other
+ASGI servers with the `http.response.zerocopysend` extension get the file
+descriptor; otherwise it is streamed in chunks.
+
+Static files use the .br/.gz variants written by collectstatic
+(blogapp.staticfiles) when the client accepts them. Names from the static
+files manifest are content hashed and cached for a year as immutable, other
+files for STATIC_MAX_AGE / MEDIA_MAX_AGE seconds.
+"""
+import mimetypes
+import os
+import stat
+from http import HTTPStatus
+from wsgiref.util import FileWrapper
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from .compression import ENCODINGS, accepted_encoding
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+
+class ServedFile:
+    """Status, headers and, unless it has no body, the open file positioned at the first byte to send."""
+
+    def __init__(self, status, headers, file=None, length=0):
+        self.status = status
+        self.headers = headers
+        self.file = file
+        self.length = length
+
+    @classmethod
+    def error(cls, status, headers=()):
+        return cls(status, [('Content-Type', 'text/plain'), ('Content-Length', '0'), *headers])
+
+
+class FileServer:
+    """Files under the directory `root` at URLs starting with `prefix`."""
+
+    def __init__(self, prefix, root, max_age, precompressed=False, immutable=frozenset()):
+        self.prefix = prefix
+        self.root = os.fspath(root)
+        self.cache_control = f'public, max-age={max_age}'
+        self.precompressed = precompressed
+        self.immutable = immutable
+
+    def matches(self, path):
+        return path.startswith(self.prefix)
+
+    def resolve(self, path):
+        """Relative name of URL `path`, None if it could point outside root."""
+        parts = [part for part in path[len(self.prefix):].split('/') if part]
+        if not parts or any(part in ('.', '..') or '\\' in part or '\0' in part for part in parts):
+            return None
+        return '/'.join(parts)
+
+    def serve(self, method, path, headers):
+        """ServedFile for a request; `headers` maps lower-case header names to values."""
+        if method not in ('GET', 'HEAD'):
+            return ServedFile.error(405, [('Allow', 'GET, HEAD')])
+        name = self.resolve(path)
+        if name is None:
+            return ServedFile.error(404)
+        full_path = os.path.join(self.root, *name.split('/'))
+        try:
+            info = os.stat(full_path)
+        except (OSError, ValueError):
+            return ServedFile.error(404)
+        if not stat.S_ISREG(info.st_mode):
+            return ServedFile.error(404)
+
+        etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+        last_modified = http_date(info.st_mtime)
+        content_type, _ = mimetypes.guess_type(name)
+        response_headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Last-Modified', last_modified),
+            ('Cache-Control', IMMUTABLE if name in self.immutable else self.cache_control),
+            ('Accept-Ranges', 'bytes'),
+            ('X-Content-Type-Options', 'nosniff'),
+        ]
+        if self.precompressed:
+            response_headers.append(('Vary', 'Accept-Encoding'))
+
+        # a range is a slice of the identity representation
+        byte_range = None
+        if 'range' in headers and self.if_range(headers.get('if-range'), etag, last_modified):
+            byte_range = self.byte_range(headers['range'], info.st_size)
+            if byte_range == ():
+                return ServedFile.error(416, [('Content-Range', f'bytes */{info.st_size}')])
+        encoding, size = None, info.st_size
+        if self.precompressed and byte_range is None:
+            encoding, size = self.variant(full_path, info, headers.get('accept-encoding'))
+        if encoding:
+            etag = f'{etag[:-1]}-{encoding}"'
+            response_headers.append(('Content-Encoding', encoding))
+        response_headers.append(('ETag', etag))
+
+        if self.not_modified(headers, etag, info.st_mtime):
+            return ServedFile(304, [header for header in response_headers
+                                    if header[0] not in ('Content-Type', 'Content-Encoding')])
+        status, offset, length = 200, 0, size
+        if byte_range:
+            status, (offset, length) = 206, byte_range
+            response_headers.append(('Content-Range', f'bytes {offset}-{offset + length - 1}/{info.st_size}'))
+        response_headers.append(('Content-Length', str(length)))
+        if method == 'HEAD':
+            return ServedFile(status, response_headers)
+        try:
+            file = open(full_path + (ENCODINGS[encoding][0] if encoding else ''), 'rb')
+        except OSError:
+            return ServedFile.error(404)
+        if offset:
+            file.seek(offset)
+        return ServedFile(status, response_headers, file, length)
+
+    def variant(self, full_path, info, accept_encoding):
+        """(encoding, size) of the precompressed variant to send, (None, size) for the file itself."""
+        available = {}
+        for encoding, (suffix, _) in ENCODINGS.items():
+            try:
+                variant = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            # older than the file: left over from a previous collectstatic
+            if variant.st_mtime >= info.st_mtime:
+                available[encoding] = variant.st_size
+        encoding = accepted_encoding(accept_encoding, available)
+        return (encoding, available[encoding]) if encoding else (None, info.st_size)
+
+    @staticmethod
+    def byte_range(header, size):
+        """(offset, length) of a single `bytes=` range, () if unsatisfiable, None to send everything."""
+        unit, _, spec = header.partition('=')
+        if unit.strip().lower() != 'bytes' or ',' in spec:
+            return None
+        first, dash, last = spec.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix <= 0:
+                    return () if suffix == 0 else None
+                return (max(size - suffix, 0), min(suffix, size)) if size else ()
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start < 0 or (last and end < start):
+            return None
+        if start >= size:
+            return ()
+        end = min(end, size - 1)
+        return start, end - start + 1
+
+    @staticmethod
+    def if_range(value, etag, last_modified):
+        """Whether a `Range` applies: no If-Range, or one naming the current version."""
+        if value is None:
+            return True
+        value = value.strip()
+        if value.startswith('"'):
+            return value == etag
+        return value == last_modified
+
+    @staticmethod
+    def not_modified(headers, etag, mtime):
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            tags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+            return '*' in tags or etag in tags
+        since = parse_http_date_safe(headers.get('if-modified-since') or '')
+        return since is not None and int(mtime) <= since
+
+
+def file_servers():
+    """FileServer for STATIC_URL and MEDIA_URL, when they are local paths."""
+    servers = []
+    if settings.MEDIA_URL.startswith('/') and settings.MEDIA_ROOT:
+        servers.append(FileServer(settings.MEDIA_URL, settings.MEDIA_ROOT,
+                                  getattr(settings, 'MEDIA_MAX_AGE', 3600)))
+    if settings.STATIC_URL.startswith('/') and settings.STATIC_ROOT:
+        servers.append(FileServer(settings.STATIC_URL, settings.STATIC_ROOT,
+                                  getattr(settings, 'STATIC_MAX_AGE', 60), precompressed=True,
+                                  immutable=frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())))
+    # the longest prefix wins, e.g. a MEDIA_URL under STATIC_URL
+    return sorted(servers, key=lambda server: -len(server.prefix))
+
+
+def _match(servers, path):
+    for server in servers:
+        if server.matches(path):
+            return server
+    return None
+
+
+class _FileRange:
+    """The next `length` bytes of `file`; fileno() is kept so the server can sendfile them."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.file.read(self.remaining if size is None or size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class WSGIFiles:
+    def __init__(self, application, servers=None):
+        self.application = application
+        self.servers = file_servers() if servers is None else servers
+
+    def __call__(self, environ, start_response):
+        # PEP 3333 paths are bytes decoded as latin-1
+        path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8', 'replace')
+        server = _match(self.servers, path)
+        if server is None:
+            return self.application(environ, start_response)
+        headers = {name[5:].replace('_', '-').lower(): value
+                   for name, value in environ.items() if name.startswith('HTTP_')}
+        response = server.serve(environ['REQUEST_METHOD'], path, headers)
+        start_response(f'{response.status} {HTTPStatus(response.status).phrase}', response.headers)
+        if response.file is None:
+            return []
+        # gunicorn's file_wrapper sends Content-Length bytes from the current offset with sendfile
+        return environ.get('wsgi.file_wrapper', FileWrapper)(_FileRange(response.file, response.length), CHUNK_SIZE)
+
+
+class ASGIFiles:
+    def __init__(self, application, servers=None):
+        self.application = application
+        self.servers = file_servers() if servers is None else servers
+
+    async def __call__(self, scope, receive, send):
+        server = _match(self.servers, scope['path']) if scope['type'] == 'http' else None
+        if server is None:
+            return await self.application(scope, receive, send)
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        # stat and open off the event loop
+        response = await sync_to_async(server.serve, thread_sensitive=False)(scope['method'], scope['path'], headers)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response.headers],
+        })
+        if response.file is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        try:
+            if 'http.response.zerocopysend' in scope.get('extensions', {}):
+                await send({'type': 'http.response.zerocopysend', 'file': response.file,
+                            'offset': response.file.tell(), 'count': response.length})
+                return
+            body = _FileRange(response.file, response.length)
+            read = sync_to_async(body.read, thread_sensitive=False)
+            while True:
+                chunk = await read(CHUNK_SIZE)
+                more_body = body.remaining > 0 and bool(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                if not more_body:
+                    break
+        finally:
+            response.file.close()
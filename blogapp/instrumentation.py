@@ -0,0 +1,211 @@
+"""
+Per-view request instrumentation.
+
+RequestStatsMiddleware records wall time, SQL query count, SQL time and
+response size for every request, aggregated in-process per
+"<METHOD> <view name>". Queries are counted with connection.execute_wrapper,
+so DEBUG and the debug cursor are not needed. The aggregates are served to
+staff users by `view_stats`. The middleware runs natively under both WSGI
+and ASGI.
+
+`pool_stats` serves the counters of the database connection pools
+(settings.DB_POOL), most usefully how long requests waited for a connection.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in ms, the last bucket is open ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class ViewStats:
+    __slots__ = ('count', 'wall_ms', 'max_wall_ms', 'queries', 'sql_ms', 'bytes', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.wall_ms = 0.0
+        self.max_wall_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.bytes = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, wall_ms, queries, sql_ms, size):
+        self.count += 1
+        self.wall_ms += wall_ms
+        self.max_wall_ms = max(self.max_wall_ms, wall_ms)
+        self.queries += queries
+        self.sql_ms += sql_ms
+        self.bytes += size
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, wall_ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of requests."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, hits in zip(LATENCY_BUCKETS_MS, self.histogram):
+            seen += hits
+            if seen >= rank:
+                return bound
+        return self.max_wall_ms
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'wall_ms': {
+                'mean': round(self.wall_ms / self.count, 3),
+                'max': round(self.max_wall_ms, 3),
+                'p50': self.percentile(0.5),
+                'p95': self.percentile(0.95),
+                'p99': self.percentile(0.99),
+                'histogram': {
+                    f'le_{bound}': hits for bound, hits in zip(LATENCY_BUCKETS_MS, self.histogram)
+                } | {'inf': self.histogram[-1]},
+            },
+            'queries_per_request': round(self.queries / self.count, 2),
+            'sql_ms_per_request': round(self.sql_ms / self.count, 3),
+            'bytes_per_request': round(self.bytes / self.count),
+        }
+
+
+class StatsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, name, wall_ms, queries, sql_ms, size):
+        with self._lock:
+            stats = self._views.get(name)
+            if stats is None:
+                stats = self._views[name] = ViewStats()
+            stats.add(wall_ms, queries, sql_ms, size)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in sorted(self._views.items())}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = StatsRegistry()
+
+
+class QueryTimer:
+    """execute_wrapper counting queries and their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class RequestStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING_HEADER', True)
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', None)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with self.wrap_connections(timer):
+            response = self.get_response(request)
+        return self.record(request, response, timer, start)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        # under ASGI the ORM runs in the request's sync thread, whose connections need the wrapper
+        stack = await sync_to_async(self.wrap_connections)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, timer, start)
+
+    def wrap_connections(self, timer):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return stack
+
+    def record(self, request, response, timer, start):
+        wall_ms = (time.perf_counter() - start) * 1000
+        sql_ms = timer.seconds * 1000
+
+        match = request.resolver_match
+        name = f'{request.method} {match.view_name if match else "unresolved"}'
+        size = 0 if response.streaming else len(response.content)
+        registry.record(name, wall_ms, timer.queries, sql_ms, size)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'app;dur={wall_ms:.2f}, db;dur={sql_ms:.2f};desc="{timer.queries} queries"')
+        if self.slow_request_ms is not None and wall_ms >= self.slow_request_ms:
+            logger.warning('Slow request %s %s: %.1fms, %d queries (%.1fms SQL)',
+                           name, request.path, wall_ms, timer.queries, sql_ms)
+        return response
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def view_stats(request):
+    """Per-view aggregates since start-up (or the last DELETE)."""
+    if request.method == 'DELETE':
+        registry.reset()
+        return Response(status=204)
+    return Response(registry.snapshot())
+
+
+def pool_snapshot(reset=False):
+    """psycopg_pool counters per pooled database alias, with the mean wait for a connection."""
+    pools = {}
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is None:
+            continue
+        stats = pool.pop_stats() if reset else pool.get_stats()
+        requests = stats.get('requests_num', 0)
+        pools[connection.alias] = {
+            **stats,
+            'wait_ms_per_request': round(stats.get('requests_wait_ms', 0) / requests, 3) if requests else 0.0,
+        }
+    return pools
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def pool_stats(request):
+    """Connection pool counters since start-up (or the last DELETE), per database alias."""
+    if request.method == 'DELETE':
+        pool_snapshot(reset=True)
+        return Response(status=204)
+    return Response(pool_snapshot())
@@ -0,0 +1,143 @@
+"""
+Precomputed OpenAPI schema.
+
+drf_yasg walks every view and every @swagger_auto_schema each time it renders
+the spec. Here the spec is generated once, by `manage.py build_openapi_schema`
+at deploy time or lazily on the first request, and kept in memory and in
+OPENAPI_SCHEMA_DIR as JSON and YAML with gzip (and, when the brotli module is
+installed, br) variants. Responses carry a content hash ETag, so clients that
+poll it get a 304. Under DEBUG the disk copy is neither read nor written, so
+schema changes show up after the autoreload.
+
+The spec is generated without a request, so it has no `host`: clients use the
+host they fetched it from. The swagger/redoc UIs load it from here too, see
+SWAGGER_SETTINGS / REDOC_SETTINGS.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from .compression import ENCODINGS, accepted_encoding
+
+API_INFO = openapi.Info(
+    title="Blog API",
+    default_version='v1',
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+FORMATS = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+
+class SchemaDocument:
+    """One format of the spec: the body, its compressed variants and the ETag."""
+
+    def __init__(self, body, encoded):
+        self.body = body
+        self.encoded = encoded
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+
+    def etag(self, encoding=None):
+        # every encoding is a different representation, with its own strong ETag
+        return quote_etag(f'{self.digest}-{encoding}' if encoding else self.digest)
+
+    @classmethod
+    def encode(cls, body):
+        return cls(body, {name: compress(body) for name, (_, compress) in ENCODINGS.items()})
+
+
+class SchemaStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = None
+
+    def documents(self):
+        """{format: SchemaDocument}, generated or loaded once per process."""
+        if self._documents is None:
+            with self._lock:
+                if self._documents is None:
+                    documents = None if settings.DEBUG else self.load()
+                    if documents is None:
+                        documents = self.generate()
+                        if not settings.DEBUG:
+                            self.save(documents)
+                    self._documents = documents
+        return self._documents
+
+    def generate(self):
+        schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+        codecs = {
+            'json': OpenAPICodecJson(validators=[]),
+            'yaml': OpenAPICodecYaml(validators=[]),
+        }
+        return {fmt: SchemaDocument.encode(codecs[fmt].encode(schema)) for fmt in FORMATS}
+
+    def path(self, fmt, suffix=''):
+        return os.path.join(settings.OPENAPI_SCHEMA_DIR, f'openapi.{fmt}{suffix}')
+
+    def load(self):
+        documents = {}
+        try:
+            for fmt in FORMATS:
+                with open(self.path(fmt), 'rb') as f:
+                    body = f.read()
+                encoded = {}
+                for name, (suffix, _) in ENCODINGS.items():
+                    with open(self.path(fmt, suffix), 'rb') as f:
+                        encoded[name] = f.read()
+                documents[fmt] = SchemaDocument(body, encoded)
+        except FileNotFoundError:
+            return None
+        return documents
+
+    def save(self, documents):
+        os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+        for fmt, document in documents.items():
+            files = {'': document.body}
+            files.update({suffix: document.encoded[name] for name, (suffix, _) in ENCODINGS.items()})
+            for suffix, data in files.items():
+                # other workers may be reading the previous version
+                fd, tmp = tempfile.mkstemp(dir=settings.OPENAPI_SCHEMA_DIR)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.chmod(tmp, 0o644)
+                os.replace(tmp, self.path(fmt, suffix))
+
+    def reset(self):
+        with self._lock:
+            self._documents = None
+
+
+store = SchemaStore()
+
+
+def schema(request, format):
+    """The precomputed spec, `format` being the `.json`/`.yaml` suffix."""
+    fmt = format.lstrip('.')
+    if fmt not in FORMATS or request.method not in ('GET', 'HEAD'):
+        raise Http404
+    document = store.documents()[fmt]
+    encoding = accepted_encoding(request.headers.get('Accept-Encoding'), document.encoded)
+    etag = document.etag(encoding)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(document.encoded[encoding] if encoding else document.body,
+                                content_type=FORMATS[fmt])
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,203 @@
+"""
+Primary/replica database routing.
+
+Reads go to a read replica (settings.DATABASE_REPLICAS) only inside a
+request with a safe method that has not written anything, and only when the
+client has not written recently. Everything else (writes, reads in unsafe
+requests, reads after a write in the same request, reads inside a
+transaction, management commands and background threads) uses `default`.
+
+ReplicaRoutingMiddleware opens the routing scope of a request. A request
+that writes pins its client (same Authorization header or session cookie)
+to the primary for REPLICA_PIN_SECONDS, which should exceed REPLICA_MAX_LAG,
+so clients read their own writes. Replicas lagging more than
+REPLICA_MAX_LAG seconds, or failing their lag check, are skipped until the
+next check; with none left reads fall back to the primary.
+
+Shared caches filled by reads need the same care for other clients: a write
+bumps the post cache generation on commit, and a replica read right after it
+would store the old rows under the new generation for the whole cache
+timeout. The post cache calls `read_from_primary` before filling an entry
+within REPLICA_MAX_LAG + REPLICA_LAG_CHECK_INTERVAL of a post write.
+"""
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+LAG_SQL = {
+    # 0 on a primary, and on a replica that has replayed everything it received
+    'postgresql': (
+        "SELECT CASE WHEN NOT pg_is_in_recovery() "
+        "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    ),
+}
+
+
+class RoutingState:
+    """Routing of the current request; mutated in place so sync_to_async threads share it."""
+    __slots__ = ('use_replicas', 'wrote', 'replica')
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+        self.replica = None
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaHealth:
+    """Per-process replication lag of every replica, measured at most every REPLICA_LAG_CHECK_INTERVAL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def healthy(self, aliases):
+        interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 2)
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', 5)
+        now = time.monotonic()
+        healthy = []
+        for alias in aliases:
+            checked_at, lag = self._checked.get(alias, (None, None))
+            if checked_at is None or now - checked_at >= interval:
+                with self._lock:
+                    checked_at, lag = self._checked.get(alias, (None, None))
+                    if checked_at is None or now - checked_at >= interval:
+                        lag = self.measure(alias)
+                        if lag is None or lag > max_lag:
+                            logger.warning('Replica %s skipped for %ss: %s', alias, interval,
+                                           'lag check failed' if lag is None else f'{lag:.1f}s behind')
+                        self._checked[alias] = (now, lag)
+            if lag is not None and lag <= max_lag:
+                healthy.append(alias)
+        return healthy
+
+    def measure(self, alias):
+        """Replication lag of `alias` in seconds, None if it cannot be measured."""
+        connection = connections[alias]
+        sql = LAG_SQL.get(connection.vendor)
+        if sql is None:
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                return float(cursor.fetchone()[0])
+        except DatabaseError:
+            connection.close()
+            return None
+
+    def snapshot(self):
+        return {alias: lag for alias, (_, lag) in self._checked.items()}
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+health = ReplicaHealth()
+
+
+def read_from_primary():
+    """Send the remaining reads of the current request to the primary, without pinning its client."""
+    state = _state.get()
+    if state is not None:
+        state.use_replicas = False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replicas or state.wrote:
+            return DEFAULT_DB_ALIAS
+        # a primary transaction sees data the replicas may not have yet
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            # one replica per request, so its reads come from one server
+            healthy = health.healthy(replicas())
+            state.replica = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        pin_key = self.pin_key(request)
+        pinned = pin_key is not None and cache.get(pin_key) is not None
+        state = RoutingState(use_replicas=request.method in SAFE_METHODS and not pinned)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and pin_key is not None:
+            cache.set(pin_key, 1, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        pin_key = self.pin_key(request)
+        pinned = pin_key is not None and await cache.aget(pin_key) is not None
+        state = RoutingState(use_replicas=request.method in SAFE_METHODS and not pinned)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and pin_key is not None:
+            await cache.aset(pin_key, 1, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+        return response
+
+    def pin_key(self, request):
+        """Cache key pinning the client of `request` to the primary; None for anonymous clients."""
+        credentials = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credentials:
+            return None
+        return 'db-pin:' + hashlib.sha1(credentials.encode()).hexdigest()
@@ -47,20 +47,25 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     'blog',
     'blog_api',
     'users',
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'drf_yasg',
     'oauth2_provider',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
+    "blogapp.instrumentation.RequestStatsMiddleware",
+    "blogapp.routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "blogapp.throttling.ThrottleMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -96,9 +101,26 @@ REST_FRAMEWORK = {
     #     # 'drf_social_oauth2.authentication.SocialAuthentication',
     # ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
+    # 401 instead of a 500 when a deleted user's token writes
+    'EXCEPTION_HANDLER': 'users.exceptions.exception_handler',
+    # JSON encoded/decoded with orjson when installed, see blog_api/renderers.py
+    'DEFAULT_RENDERER_CLASSES': (
+        'blog_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'blog_api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # reverse proxies in front of the app that append to X-Forwarded-For; with 0 the client is
+    # REMOTE_ADDR and the header is ignored, so it cannot pick its own throttle bucket
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
 }
+# 'auto' (orjson if installed), 'orjson' or 'json' (the standard library)
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
 
 
 AUTHENTICATION_BACKENDS = (
@@ -112,6 +134,8 @@ WSGI_APPLICATION = "blogapp.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+DB_POOL = str(os.environ.get('DB_POOL', 'True')).lower() in ['1', 'true', 'yes', 'on']
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -119,10 +143,90 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # without the pool: 0 under ASGI (blogapp/asgi.py), requests run their queries in short-lived threads
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        # with the pool, connections are checked when they are handed out
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # psycopg_pool.ConnectionPool per process; a request holds a connection from its first
+            # query until it finishes, and waits at most DB_POOL_TIMEOUT seconds for one
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+                'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            },
+        } if DB_POOL else {},
+    }
+}
+
+# Read replicas, see blogapp/routers.py: comma separated host[:port], sharing the
+# primary's database name and credentials
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, map(str.strip, os.getenv('DB_REPLICA_HOSTS', '').split(','))), 1):
+    host, _, port = replica.rpartition(':') if replica.rpartition(':')[2].isdigit() else (replica, '', '')
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['blogapp.routers.PrimaryReplicaRouter']
+# replicas further behind are skipped; clients read from the primary for DB_REPLICA_PIN_SECONDS after a write
+# and post cache entries filled within MAX_LAG + LAG_CHECK_INTERVAL of any post write read the primary
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', 2))
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+
+# GET/HEAD of the hot read endpoints served by coroutines, see blog_api/async_views.py;
+# on by default under blogapp/asgi.py
+ASYNC_READ_VIEWS = str(os.environ.get('ASYNC_READ_VIEWS', 'False')).lower() in ['1', 'true', 'yes', 'on']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# locmem unless REDIS_URL points at a Redis-compatible server
+
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Token-bucket throttling before authentication, see blogapp/throttling.py. Buckets live in
+# THROTTLE_CACHE_ALIAS (shared by all processes with Redis); rates are '<requests>/<period>'
+THROTTLE_CACHE_ALIAS = os.getenv('THROTTLE_CACHE_ALIAS', 'default')
+THROTTLE_RATES = {
+    'search': os.getenv('THROTTLE_SEARCH_RATE', '30/min'),
+    'login': os.getenv('THROTTLE_LOGIN_RATE', '10/min'),
+    'signup': os.getenv('THROTTLE_SIGNUP_RATE', '20/hour'),
+}
+# url name: scope, or {method: scope}
+THROTTLE_SCOPES = {
+    'blog_api:search': 'search',
+    'users:authors_search': 'search',
+    'token_obtain_pair': 'login',
+    'users:user-list': {'POST': 'signup'},
 }
 
+# serialized post payloads, see blog_api/cache.py
+POST_CACHE_ALIAS = os.getenv('POST_CACHE_ALIAS', 'default')
+POST_CACHE_TIMEOUT = int(os.getenv('POST_CACHE_TIMEOUT', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -142,6 +246,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PBKDF2 on a bounded thread pool per process, see users/hashing.py; the other hashers only
+# verify passwords stored with them
+PASSWORD_HASHERS = [
+    "users.hashing.BoundedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+# `manage.py tune_password_hasher` suggests a value; stored hashes are upgraded on login
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 870000))
+# hashes running at once per process, and how long a login waits for a slot before a 503
+PASSWORD_HASHING_CONCURRENCY = int(os.getenv('PASSWORD_HASHING_CONCURRENCY', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASHING_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASHING_QUEUE_TIMEOUT', 5))
+
 
 LOGGING = {
     'version': 1,
@@ -157,6 +276,10 @@ LOGGING = {
     },
 }
 
+# request instrumentation, see blogapp/instrumentation.py
+SERVER_TIMING_HEADER = str(os.environ.get('SERVER_TIMING_HEADER', 'True')).lower() in ['1', 'true', 'yes', 'on']
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -175,8 +298,39 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATIC_ROOT = 'static'
+# uploads live outside STATIC_ROOT, so collectstatic never touches them
 MEDIA_URL = '/media/'
-MEDIA_ROOT = 'static/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# collectstatic writes content-hashed names with .gz/.br variants, see blogapp/staticfiles.py;
+# off by default under DEBUG, where runserver serves the app directories
+STATIC_MANIFEST = str(os.environ.get('STATIC_MANIFEST', str(not DEBUG))).lower() in ['1', 'true', 'yes', 'on']
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': ('blogapp.staticfiles.CompressedManifestStaticFilesStorage' if STATIC_MANIFEST
+                    else 'django.contrib.staticfiles.storage.StaticFilesStorage'),
+    },
+}
+# served by blogapp/fileserver.py in front of Django; hashed static names are cached for a year
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 60))
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 3600))
+
+# OpenAPI spec generated once and served precompressed, see blogapp/openapi.py;
+# `manage.py build_openapi_schema` writes it at deploy time
+OPENAPI_SCHEMA_DIR = os.getenv('OPENAPI_SCHEMA_DIR', os.path.join(BASE_DIR, 'openapi'))
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+# profile photo renditions, see users.images (0 workers renders on commit, in-process)
+PHOTO_WORKERS = int(os.getenv('PHOTO_WORKERS', 2))
+PHOTO_RENDITION_SIZES = (64, 128, 256, 512)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -226,8 +380,8 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.ClaimsTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -236,3 +390,15 @@ SIMPLE_JWT = {
 
 # custom user model
 AUTH_USER_MODEL = os.getenv('AUTH_USER_MODEL')
+
+# full user rows loaded by users.authentication.ClaimsJWTAuthentication
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', 30))
+JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', 1024))
+
+# in-process refresh token blacklist filter, see users.tokens; only with a shared cache (REDIS_URL),
+# otherwise every refresh checks the table. Expired tokens are not purged on requests, run
+# `manage.py flushexpiredtokens` periodically (cron, a scheduled job).
+BLACKLIST_SYNC_INTERVAL = int(os.getenv('BLACKLIST_SYNC_INTERVAL', 5))
+BLACKLIST_REBUILD_INTERVAL = int(os.getenv('BLACKLIST_REBUILD_INTERVAL', 3600))
+BLACKLIST_RECENT_SIZE = int(os.getenv('BLACKLIST_RECENT_SIZE', 10000))
+BLACKLIST_FILTER_ERROR_RATE = float(os.getenv('BLACKLIST_FILTER_ERROR_RATE', 0.01))
@@ -0,0 +1,64 @@
+"""
+Production static files storage.
+
+`collectstatic` writes every file under its content-hashed name (see
+ManifestStaticFilesStorage) and, for text formats, a .gz and .br (with the
+brotli module) variant next to both names, so blogapp.fileserver can send
+them as they are. Hashed names never change content and are served with
+far-future immutable caching.
+"""
+import os
+import tempfile
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from .compression import ENCODINGS
+
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico',
+                '.ttf', '.otf', '.eot', '.md')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # smaller files gain less than the header bytes of a Content-Encoding
+    compress_min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in sorted(names):
+                if name and name.endswith(COMPRESSIBLE):
+                    self.compress(name)
+
+    def compress(self, name):
+        """Write the variants of `name` that are smaller than it; returns their encodings."""
+        path = self.path(name)
+        mtime = os.stat(path).st_mtime
+        written = []
+        data = None
+        for encoding, (suffix, compress) in ENCODINGS.items():
+            target = path + suffix
+            try:
+                if os.stat(target).st_mtime >= mtime:
+                    written.append(encoding)
+                    continue
+            except FileNotFoundError:
+                pass
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            compressed = compress(data) if len(data) >= self.compress_min_size else data
+            if len(compressed) >= len(data) * 0.95:
+                # not worth it, and a variant of the previous content must not be served
+                if os.path.exists(target):
+                    os.remove(target)
+                continue
+            # a running server may be reading the previous version
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compressed)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, target)
+            written.append(encoding)
+        return written
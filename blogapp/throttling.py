@@ -0,0 +1,198 @@
+"""
+Token-bucket throttling ahead of authentication.
+
+ThrottleMiddleware resolves the URL itself and, for the views listed in
+settings.THROTTLE_SCOPES, takes a token from the bucket of the scope and the
+client before the session, authentication, parsing or the view run, so a
+flood costs one bucket update per request. A rejected request gets a 429
+with DRF's `Throttled` body and `Retry-After`.
+
+The client is the user of a valid JWT access token (signature and expiry are
+checked, the user row is not loaded) or, without one, the IP address as DRF
+determines it: REMOTE_ADDR, or with settings.REST_FRAMEWORK['NUM_PROXIES']
+trusted proxies the address they add to X-Forwarded-For. A bucket holds as
+many tokens as the '<requests>/<period>' rate of its scope allows per
+period, and refills continuously at that rate.
+
+Buckets live in the THROTTLE_CACHE_ALIAS cache. With the Redis backend every
+update is one atomic Lua script using the server's clock, shared by all
+processes; other backends (locmem in development and tests) update under a
+process lock. If the store fails, requests are let through.
+"""
+import logging
+import math
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+TOKEN_BUCKET_LUA = """
+local rate, capacity, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or capacity
+local at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - at) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+def parse_rate(rate):
+    """(tokens per second, capacity) of a DRF style rate such as '10/min'."""
+    requests, _, period = rate.partition('/')
+    requests = int(requests)
+    return requests / PERIODS[period.strip()[0]], requests
+
+
+def refill(tokens, elapsed, rate, capacity, cost):
+    """(tokens left, seconds to wait) after taking `cost` tokens; nothing is taken when waiting."""
+    tokens = min(capacity, tokens + max(elapsed, 0) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class CacheBucketStore:
+    """Buckets as cache entries, updated under a process lock; atomic for locmem, per process otherwise."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, cost=1):
+        """Seconds to wait before `cost` tokens are available, 0 if they were taken."""
+        now = time.time()
+        with self._lock:
+            tokens, at = self.cache.get(key) or (capacity, now)
+            tokens, wait = refill(tokens, now - at, rate, capacity, cost)
+            self.cache.set(key, (tokens, now), math.ceil(capacity / rate))
+        return wait
+
+    async def atake(self, key, rate, capacity, cost=1):
+        return self.take(key, rate, capacity, cost)
+
+
+class RedisBucketStore:
+    """Buckets as Redis hashes, updated by one script, so every process shares them."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._script = None
+
+    def take(self, key, rate, capacity, cost=1):
+        key = self.cache.make_key(key)
+        client = self.cache._cache.get_client(key, write=True)
+        if self._script is None:
+            self._script = client.register_script(TOKEN_BUCKET_LUA)
+        return float(self._script(keys=[key], args=[rate, capacity, cost], client=client))
+
+    async def atake(self, key, rate, capacity, cost=1):
+        return await sync_to_async(self.take, thread_sensitive=False)(key, rate, capacity, cost)
+
+
+_stores = {}
+
+
+def bucket_store():
+    alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')
+    cache = caches[alias]
+    store = _stores.get(alias)
+    if store is None or store.cache is not cache:
+        store = _stores[alias] = (RedisBucketStore if isinstance(cache, RedisCache) else CacheBucketStore)(cache)
+    return store
+
+
+def throttled(wait):
+    wait = math.ceil(wait)
+    response = JsonResponse({'detail': str(Throttled(wait).detail)}, status=429)
+    response['Retry-After'] = str(wait)
+    return response
+
+
+class ThrottleMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.authentication = JWTAuthentication()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        bucket = self.bucket(request)
+        if bucket is not None:
+            try:
+                wait = bucket_store().take(*bucket)
+            except Exception:
+                logger.exception('Throttle store failed, request let through')
+                wait = 0
+            if wait:
+                return throttled(wait)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        bucket = self.bucket(request)
+        if bucket is not None:
+            try:
+                wait = await bucket_store().atake(*bucket)
+            except Exception:
+                logger.exception('Throttle store failed, request let through')
+                wait = 0
+            if wait:
+                return throttled(wait)
+        return await self.get_response(request)
+
+    def bucket(self, request):
+        """(key, rate, capacity) of the bucket `request` draws from, None if its view is not throttled."""
+        scopes = getattr(settings, 'THROTTLE_SCOPES', {})
+        if not scopes:
+            return None
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        scope = scopes.get(view_name)
+        if isinstance(scope, dict):
+            scope = scope.get(request.method)
+        if scope is None:
+            return None
+        rate, capacity = parse_rate(settings.THROTTLE_RATES[scope])
+        return f'throttle:{scope}:{self.client(request)}', rate, capacity
+
+    def client(self, request):
+        header = self.authentication.get_header(request)
+        try:
+            raw_token = header and self.authentication.get_raw_token(header)
+            if raw_token:
+                token = self.authentication.get_validated_token(raw_token)
+                return f'user:{token[jwt_settings.USER_ID_CLAIM]}'
+        except (AuthenticationFailed, TokenError, KeyError):
+            # rejected by authentication later, until then it is just an IP
+            pass
+        return f'ip:{BaseThrottle().get_ident(request)}'
@@ -16,8 +16,6 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -25,28 +23,29 @@ from rest_framework_simplejwt.views import (
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from . import openapi
+from .instrumentation import pool_stats, view_stats
+from users.hashing import password_hashing_stats
+from blog_api.cache import post_cache_stats
 
 
+# the UIs only render their page, the spec comes from openapi.schema (SWAGGER_SETTINGS['SPEC_URL'])
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Blog API",
-        default_version='v1',
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
+    openapi.API_INFO,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
 
 
 urlpatterns = [
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    path('swagger<format>/', openapi.schema, name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path("admin/", admin.site.urls),
+    path('api/stats/views/', view_stats, name='view_stats'),
+    path('api/stats/db-pool/', pool_stats, name='pool_stats'),
+    path('api/stats/password-hashing/', password_hashing_stats, name='password_hashing_stats'),
+    path('api/stats/post-cache/', post_cache_stats, name='post_cache_stats'),
     path('', include('blog.urls', namespace='blog')),
     path('api/', include('blog_api.urls', namespace='blog_api')),
     path('accounts/', include('users.urls', namespace='users')),
@@ -56,6 +55,3 @@ urlpatterns = [
     re_path(r'^auth/', include('drf_social_oauth2.urls', namespace='drf')),
 
 ]
-
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
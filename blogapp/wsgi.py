@@ -10,7 +10,9 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from .fileserver import WSGIFiles
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogapp.settings")
 
-application = get_wsgi_application()
+# static and media files are answered before Django, see blogapp/fileserver.py
+application = WSGIFiles(get_wsgi_application())